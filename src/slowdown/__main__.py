@@ -67,10 +67,6 @@ Examples:
     )
 """
 
-import sys
-
-sys.dont_write_bytecode = True
-
 import argparse
 import copy
 import collections
@@ -85,6 +81,7 @@ import os
 import os.path
 import re
 import resource
+import sys
 import traceback
 import weakref
 import ZConfig.loader
@@ -239,6 +236,10 @@ def spawn(**kwargs):
             except Exception:
                 gvars.logger.warning('Require root permission to allocate '
                                      'resources')
+    # Keep the bytecode of user packages out of the project tree,
+    # it is written to $HOME/var/pycache and reused on the next startup.
+    if hasattr(sys, 'pycache_prefix') and sys.pycache_prefix is None:
+        sys.pycache_prefix = os.path.join(opts.home, 'var', 'pycache')
     # Add $HOME/pkgs that contains the user package to sys.path
     pkgs_dir = os.path.join(opts.home, 'pkgs')
     if pkgs_dir not in sys.path:
@@ -634,13 +635,7 @@ class Broken(type(sys)):
             return rw.internal_server_error()
 
 def exc():
-    file = tb_file()
-    traceback.print_exc(file=file)
-    return ''.join(file)
-
-class tb_file(list):
-
-    write = list.append
+    return traceback.format_exc()
 
 def handler(rw):
     rw.send_html_and_close(content=itworks_content)
@@ -832,7 +827,7 @@ def ParserFactory(**kwargs):
                dest='root',
                type=str,
             metavar='DIRECTORY',
-               help=f'working dir, the default is $HOME/var',
+               help='working dir, the default is $HOME/var',
             default=None
         )
     else:
@@ -954,7 +949,8 @@ def Routers(section):
 
 class Router(object):
 
-    __slots__ = ['args', 'groups', 'name', 'regex', 'section']
+    __slots__ = ['args', 'group_index', 'groups', 'name', 'regex',
+                 'section']
 
     def __init__(self, section):
         self.name    = NormalizedSectionName(section)
@@ -973,6 +969,7 @@ class Router(object):
                     raise ValueError(f'duplicate group name "{name}" '
                                      'exists')
                 self.groups[name] = subsection
+        self.group_index = group_index(self.regex, self.groups)
 
     def __call__(self, host, path_info):
         (   "__call__("
@@ -983,25 +980,27 @@ class Router(object):
         Look for the package from **HTTP_HOSTS** and **PATH_INFO** .
         """)
         for match1 in self.regex.finditer(host):
-            if match1.lastgroup is None:
+            index1 = match1.lastindex
+            if index1 is None:
                 continue
-            key1   = match1.lastgroup.upper()
-            group1 = self.groups.get(key1)
+            group1 = self.group_index[index1]
             if group1 is not None:
                 break
         else:
             return None
         for match2 in group1.regex.finditer(path_info):
-            if match2.lastgroup is None:
+            index2 = match2.lastindex
+            if index2 is None:
                 continue
-            key2   = match2.lastgroup.upper()
-            group2 = group1.groups.get(key2)
+            group2 = group1.group_index[index2]
             if group2 is None:
+                if match2.lastgroup is None:
+                    continue
                 return None
             return \
                 MatchResult(
-                    match1.groupdict()[key1],
-                    match2.groupdict()[key2],
+                    match1.group(index1),
+                    match2.group(index2),
                     self,
                     group1,
                     group2
@@ -1011,7 +1010,8 @@ class Router(object):
 
 class HostSection(object):
 
-    __slots__ = ['args', 'groups', 'name', 'regex', 'section']
+    __slots__ = ['args', 'group_index', 'groups', 'name', 'regex',
+                 'section']
 
     def __init__(self, section):
         self.name    = NormalizedSectionName(section)
@@ -1030,6 +1030,7 @@ class HostSection(object):
                     raise ValueError(f'duplicate group name "{name}" '
                                      'exists')
                 self.groups[name] = subsection
+        self.group_index = group_index(self.regex, self.groups)
 
 class PathSection(object):
 
@@ -1056,6 +1057,22 @@ def AbsolutePathString(s):
         raise ValueError(f'{repr(base)} is not an existing folder')
     return os.path.join(os.path.abspath(base), name)
 
+def group_index(regex, groups):
+    (   "group_index("
+            "regex:re.Pattern, "
+            "groups:Dict[str, Any]"
+        ") -> Tuple[Any, ...]" """
+
+    The sections of `groups` indexed by the number of their named group
+    in `regex`, so that a match is looked up by its `lastindex`. Group
+    names are matched to the section names in upper case, groups
+    without a section are None.
+    """)
+    index = [None] * (regex.groups + 1)
+    for name, i in regex.groupindex.items():
+        index[i] = groups.get(name.upper())
+    return tuple(index)
+
 def RegexString(s):
     try:
         re.compile(s)
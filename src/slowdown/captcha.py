@@ -49,7 +49,7 @@ except ModuleNotFoundError:
             'but can be installed with: \'pip install captcha\''
         )
 
-import base64
+import binascii
 import random
 import time
 
@@ -98,23 +98,10 @@ class Captcha(object):
         else:
             self.image_format = image_format
         self.image_generator = captcha.image.ImageCaptcha()
-        expiration_time = int(time.time()) \
-                        + self.expiration_time
-        self.cache = \
-            [
-                Media(
-                    ''.join(
-                        random.choice(alphabet)
-                        for dummy in
-                            range(self.text_len)
-                    ),
-                    expiration_time,
-                    self.image_generator,
-                    self.image_format
-                )
-                for dummy in
-                    range(self.cache_size)
-            ]
+
+        # Slots are filled on demand by `new()`, and the image of a
+        # captcha is rendered when it is first read.
+        self.cache = [None] * self.cache_size
 
     def new(self):
         (   "new() -> Media" """
@@ -124,15 +111,11 @@ class Captcha(object):
         now   = int(time.time())
         index = random.randint(0, self.cache_size-1)
         item  = self.cache[index]
-        if item.expiration_time > now:
+        if item is not None and item.expiration_time > now:
             return item
         item = \
             Media(
-                ''.join(
-                    random.choice(alphabet)
-                    for dummy in
-                        range(self.text_len)
-                ),
+                self._gen_text(),
                 now + self.expiration_time,
                 self.image_generator,
                 self.image_format
@@ -140,6 +123,9 @@ class Captcha(object):
         self.cache[index] = item
         return item
 
+    def _gen_text(self):
+        return ''.join(random.choices(alphabet, k=self.text_len))
+
 class Media(object):
 
     """
@@ -151,7 +137,9 @@ class Media(object):
                  'image_format',
                  'text',
                  '_image',
-                 '_image_base64']
+                 '_image_base64',
+                 '_img',
+                 '_img_src']
 
     def __init__(self, text, expiration_time, image_generator,
                  image_format):
@@ -159,6 +147,10 @@ class Media(object):
         self.expiration_time = expiration_time
         self.image_generator = image_generator
         self.image_format    =    image_format
+        self._image          = None
+        self._image_base64   = None
+        self._img            = None
+        self._img_src        = None
 
     @property
     def image(self):
@@ -167,7 +159,7 @@ class Media(object):
 
         :rtype: bytes
         """
-        image = getattr(self, '_image', None)
+        image = self._image
         if image is None:
             image = self                                              \
                   . image_generator                                   \
@@ -185,16 +177,10 @@ class Media(object):
 
         :rtype: str
         """
-        image_base64 = getattr(self, '_image_base64', None)
+        image_base64 = self._image_base64
         if image_base64 is None:
-            image = getattr(self, '_image', None)
-            if image is None:
-                image = self                                          \
-                      . image_generator                               \
-                      . generate(self.text, format=self.image_format) \
-                      . getvalue()
-                self._image = image
-            image_base64 = base64.b64encode(image).decode('utf-8')
+            image_base64 = \
+                binascii.b2a_base64(self.image, newline=False).decode('ascii')
             self._image_base64 = image_base64
             return image_base64
         else:
@@ -208,7 +194,14 @@ class Media(object):
 
         :rtype: str
         """
-        return f'data:image/{self.image_format};base64,{self.image_base64}'
+        img_src = self._img_src
+        if img_src is None:
+            img_src = \
+                f'data:image/{self.image_format};base64,{self.image_base64}'
+            self._img_src = img_src
+            return img_src
+        else:
+            return img_src
 
     def get_img(self, alt=None):
         (   "get_img("
@@ -218,16 +211,25 @@ class Media(object):
         Returns a HTML IMG tag that contains the captcha image.
         """)
         if alt is None:
-            return f'<img src="{self.img_src}" />'
+            img = self._img
+            if img is None:
+                img = f'<img src="{self.img_src}" />'
+                self._img = img
+            return img
         else:
-            alt = alt                    \
-                . replace('&', '&amp;' ) \
-                . replace('<', '&lt;'  ) \
-                . replace('>', '&gt;'  ) \
-                . replace('"', '&quot;') \
-                . replace("'", '&#x27;')
+            alt = alt.translate(html_escape_table)
             return f'<img src="{self.img_src}" alt="{alt}" />'
 
     img = property(get_img)
 
 alphabet = '23456789abcdefghijkmnprstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ'
+html_escape_table = \
+    str.maketrans(
+        {
+            '&': '&amp;' ,
+            '<': '&lt;'  ,
+            '>': '&gt;'  ,
+            '"': '&quot;',
+            "'": '&#x27;'
+        }
+    )
@@ -52,18 +52,22 @@ Examples:
 """
 
 import cgi
+import collections
+import functools
 import io
 import sys
 import urllib.error
+import urllib.parse
 
 from . import http
-from . import urlencode
 
 __all__ = ['BadRequest', 'Form', 'multipart', 'MultipartReader']
 
-default_form_max_size       = 0x200000
-default_form_key_encoding   = 'utf-8'
-default_form_value_encoding = 'utf-8'
+default_form_max_size         = 0x200000
+default_form_key_encoding     = 'utf-8'
+default_form_value_encoding   = 'utf-8'
+default_multipart_buffer_size = 0x10000
+min_multipart_buffer_size     = 0x1000
 
 class Form(dict):
 
@@ -88,40 +92,67 @@ class Form(dict):
                              f'than the configured limit ({max_size})')
         self.  key_encoding =   key_encoding
         self.value_encoding = value_encoding
+        values = collections.defaultdict(list)
         if rw.left > 0:
             b_query_string = rw.read()
-            self.update_query_string(b_query_string)
+            self._parse_query_string(b_query_string, values)
         u_query_string = rw.environ['QUERY_STRING']
         if u_query_string:
-            self.update_query_string(
-                u_query_string.encode(http.http_header_encoding)
+            self._parse_query_string(
+                u_query_string.encode(http.http_header_encoding),
+                values
             )
+        for k, vs in values.items():
+            if 1 == len(vs):
+                self[k] = vs[0]
+            else:
+                self[k] = vs
 
     def update_query_string(self, b_query_string):
-        for item in b_query_string.split(b'&'):
-            kv = item.split(b'=', 1)
-            if len(kv) != 2:
-                continue
-            b_k, b_v = kv
-            if self.key_encoding is None:
-                k = urlencode.unquote_plus(b_k)
-            else:
-                k = urlencode.unquote_plus(b_k).decode(self.  key_encoding)
-            if self.value_encoding is None:
-                v = urlencode.unquote_plus(b_v)
-            else:
-                v = urlencode.unquote_plus(b_v).decode(self.value_encoding)
+        values = collections.defaultdict(list)
+        self._parse_query_string(b_query_string, values)
+        for k, vs in values.items():
             value = self.get(k)
             if value is None:
-                self[k] = v
+                if 1 == len(vs):
+                    self[k] = vs[0]
+                else:
+                    self[k] = vs
             elif isinstance(value, (str, bytes)):
-                self[k] = [value, v]
+                self[k] = [value] + vs
             elif isinstance(value, list):
-                value.append(v)
+                value.extend(vs)
             else:
                 raise AssertionError('value must be a list or a bytes '
                                      'but got {!r}'.format(value))
 
+    def _parse_query_string(self, b_query_string, values):
+        # Percent-decode straight to bytes and decode once, the way
+        # `urllib.parse.parse_qsl` handles each pair, without its ascii
+        # coercion of bytes input.
+        unquote = urllib.parse.unquote_to_bytes
+        key_encoding   = self.  key_encoding
+        value_encoding = self.value_encoding
+        # Walk the pairs by offset so that only the key and the value of
+        # each pair are sliced out of the query string.
+        find  = b_query_string.find
+        end   = len(b_query_string)
+        start = 0
+        while start < end:
+            amp = find(b'&', start)
+            if -1 == amp:
+                amp = end
+            eq = find(b'=', start, amp)
+            if -1 != eq:
+                k = unquote(b_query_string[start:eq].replace(b'+', b' '))
+                if key_encoding is not None:
+                    k = k.decode(key_encoding)
+                v = unquote(b_query_string[eq+1:amp].replace(b'+', b' '))
+                if value_encoding is not None:
+                    v = v.decode(value_encoding)
+                values[k].append(v)
+            start = amp + 1
+
 def multipart(rw, filename_encoding=None, buffer_size=None):
     (   "multipart("
             "rw:slowdown.http.File, "
@@ -129,9 +160,7 @@ def multipart(rw, filename_encoding=None, buffer_size=None):
             "buffer_size:int=None"
         ") -> Iterator[MultipartReader]"
     )
-    if buffer_size is None:
-        buffer_size = io.DEFAULT_BUFFER_SIZE
-    p_dict = cgi.parse_header(rw.environ['CONTENT_TYPE'])[1]
+    p_dict = _parse_header(rw.environ['CONTENT_TYPE'])[1]
     boundary = p_dict['boundary'].encode(http.http_header_encoding)
     data = rw.readline(2048)
     if b'\r\n' == data[-2:]:
@@ -152,42 +181,179 @@ def multipart(rw, filename_encoding=None, buffer_size=None):
         raw = MultipartRawIO (rw, boundary, nl)
         yield MultipartReader(rw, raw, buffer_size)
 
-class MultipartReader(io.BufferedReader):
+class MultipartReader(io.BufferedIOBase):
+
+    (   "MultipartReader("
+            "rw:slowdown.http.File, "
+            "raw:MultipartRawIO, "
+            "buffer_size:int=None"
+        ")" """
+
+    A reader of one part of the multipart message, the content is read
+    from `raw` into a single reusable buffer. The buffer is allocated on
+    the first read, no larger than what is left of the message.
+    """)
 
-    __slots__ = ['environ',
+    __slots__ = ['buffer',
+                 'buffer_size',
+                 'environ',
                  'filename',
                  'name',
+                 'raw',
+                 'start',
+                 'stop',
+                 'view',
                  '_filename_encoding']
 
     def __init__(self, rw, raw, buffer_size=None):
+        io.BufferedIOBase.__init__(self)
         if buffer_size is None:
-            buffer_size = io.DEFAULT_BUFFER_SIZE
-        environ = {}
-        data = rw.readline(2048)
-        size = len(data)
+            buffer_size = default_multipart_buffer_size
         self._filename_encoding = http.http_header_encoding
-        while 1:
-            match = http.regx_headers.match(data)
-            if match is None:
-                if b'\r\n' == data or b'\n' == data:
-                    break
-                raise BadRequest('Invalid http headers')
-            (b_key, b_value) = match.groups()
-            key = b_key.decode(self._filename_encoding) \
-                       .replace('-', '_') \
-                       .upper()
-            environ['HTTP_' + key] = \
-                b_value.decode(self._filename_encoding)
-            data = rw.readline(2048)
-            size += len(data)
-            if size > 8192:
-                raise BadRequest('Request header is too large')
-        g_dict = cgi.parse_header(environ['HTTP_CONTENT_DISPOSITION'])[1]
-        io.BufferedReader.__init__(self, raw, buffer_size)
+        try:
+            environ = http.read_headers(rw, {}, self._filename_encoding)
+        except ValueError as err:
+            raise BadRequest(str(err))
+        g_dict = _parse_header(environ['HTTP_CONTENT_DISPOSITION'])[1]
+        self.raw      = raw
+        self.buffer   = None
+        self.view     = None
+        self.start    = 0
+        self.stop     = 0
         self.name     = g_dict.get('name')
         self.filename = g_dict.get('filename')
         self.environ  = environ
 
+        # `MultipartRawIO.readinto` copies up to a whole line at once.
+        self.buffer_size = \
+            max(min(buffer_size, raw.guess_size), min_multipart_buffer_size)
+
+    def read(self, size=-1):
+        (   "read("
+                "size:int=-1"
+            ") -> bytes" """
+
+        Read at most `size` bytes, or all the remaining content of the
+        part if `size` is negative. An empty bytes object is returned
+        at the end of the part.
+        """)
+        if size is None or size < 0:
+            size = -1
+        chunks = []
+        while 0 != size:
+            if self.start == self.stop and 0 == self.fill():
+                break
+            if size < 0:
+                end = self.stop
+            else:
+                end = min(self.start + size, self.stop)
+                size -= end - self.start
+            chunks.append(self.view[self.start:end].tobytes())
+            self.start = end
+        return b''.join(chunks)
+
+    def read1(self, size=-1):
+        (   "read1("
+                "size:int=-1"
+            ") -> bytes" """
+
+        Read at most `size` bytes with at most one read from `raw`.
+        """)
+        if self.start == self.stop and 0 == self.fill():
+            return b''
+        if size is None or size < 0:
+            end = self.stop
+        else:
+            end = min(self.start + size, self.stop)
+        data = self.view[self.start:end].tobytes()
+        self.start = end
+        return data
+
+    def peek(self, size=0):
+        (   "peek("
+                "size:int=0"
+            ") -> bytes" """
+
+        Return the buffered content without consuming it, the buffer is
+        refilled first if it is empty.
+        """)
+        if self.start == self.stop and 0 == self.fill():
+            return b''
+        return self.view[self.start:self.stop].tobytes()
+
+    def readinto(self, b):
+        (   "readinto("
+                "b:bytearray"
+            ") -> int" """
+
+        Read the content into the writable buffer `b` until it is full
+        or the part ends, returns the number of bytes read. When the
+        buffer is empty and at least `min_multipart_buffer_size` bytes
+        are wanted, `raw` writes into `b` directly.
+        """)
+        view  = memoryview(b).cast('B')
+        size  = len(view)
+        total = 0
+        while total < size:
+            if self.start == self.stop:
+                if size - total >= min_multipart_buffer_size:
+                    n = self.raw.readinto(view[total:])
+                    if 0 == n:
+                        break
+                    total += n
+                    continue
+                if 0 == self.fill():
+                    break
+            n = min(self.stop - self.start, size - total)
+            view[total:total+n] = self.view[self.start:self.start+n]
+            self.start += n
+            total      += n
+        return total
+
+    def readline(self, size=-1):
+        (   "readline("
+                "size:int=-1"
+            ") -> bytes"
+        )
+        if size is None or size < 0:
+            size = -1
+        chunks = []
+        while 0 != size:
+            if self.start == self.stop and 0 == self.fill():
+                break
+            if size < 0:
+                end = self.stop
+            else:
+                end = min(self.start + size, self.stop)
+            pos = self.buffer.find(b'\n', self.start, end)
+            if -1 != pos:
+                end = pos + 1
+                size = 0
+            elif size > 0:
+                size -= end - self.start
+            chunks.append(self.view[self.start:end].tobytes())
+            self.start = end
+        return b''.join(chunks)
+
+    def fill(self):
+        (   "fill() -> int" """
+
+        Refill the buffer from `raw` if all the buffered content has
+        been consumed, returns 0 at the end of the part.
+        """)
+        if self.start < self.stop:
+            return self.stop - self.start
+        view = self.view
+        if view is None:
+            self.buffer = bytearray(self.buffer_size)
+            view = self.view = memoryview(self.buffer)
+        self.start = 0
+        self.stop  = self.raw.readinto(view)
+        return self.stop
+
+    def readable(self):
+        return True
+
     @property
     def filename_encoding(self):
         return self._filename_encoding
@@ -206,12 +372,16 @@ class MultipartReader(io.BufferedReader):
 
 class MultipartRawIO(io.RawIOBase):
 
-    __slots__ = ['guess_size',
+    __slots__ = ['delimiter',
+                 'delimiter_len',
+                 'guess_size',
                  'met_EOF',
                  'next_',
                  'next_len',
                  'nl',
                  'nl_len',
+                 'nl_state',
+                 'peek',
                  'rw',
                  'stop_',
                  'stop_len',
@@ -220,144 +390,180 @@ class MultipartRawIO(io.RawIOBase):
     def __init__(self, rw, boundary, nl):
         io.RawIOBase.__init__(self)
         if b'\r\n' == nl:
-            self.nl     = b'\r\n'
-            self.nl_len = 2
-            self.next_  = b'--%s\r\n' % boundary
-            self.stop_  = b'--%s--\r\n' % boundary
+            self.nl       = b'\r\n'
+            self.nl_len   = 2
+            self.nl_state = 3
+            self.next_    = b'--%s\r\n' % boundary
+            self.stop_    = b'--%s--\r\n' % boundary
         elif b'\n' == nl:
-            self.nl     = b'\n'
-            self.nl_len = 1
-            self.next_  = b'--%s\n' % boundary
-            self.stop_  = b'--%s--\n' % boundary
+            self.nl       = b'\n'
+            self.nl_len   = 1
+            self.nl_state = 2
+            self.next_    = b'--%s\n' % boundary
+            self.stop_    = b'--%s--\n' % boundary
         else:
             raise BadRequest()
         self.next_len = len(self.next_)
         self.stop_len = len(self.stop_)
+
+        # Every boundary line is preceded by a newline, content before
+        # the first occurrence of `delimiter` can be copied as is.
+        self.delimiter     = b'%s--%s' % (self.nl, boundary)
+        self.delimiter_len = len(self.delimiter)
+        self.peek = getattr(rw.reader, 'peek', None)
         self.rw = rw
         self.guess_size = rw.left - self.nl_len - self.stop_len
         self.met_EOF = False
-        self.tail = None
+        self.tail = 0
 
     def readinto(self, b):
         if self.met_EOF:
             return 0
-        data = self.rw.readline(2048)
-        if not data:
-            raise BadRequest()
-        size = len(data)
-        if LF == data[-1]:
-            if self.tail is None:
-                if 2 == self.nl_len:
-                    if size > 1 and b'\r\n' == data[size-2:size]:
-                        res = size - 2
-                        self.tail = b'\r\n'
+        if 0 == self.tail and self.peek is not None:
+            res = self.scan(b)
+            if res > 0:
+                return res
+        while True:
+            data = self.rw.readline(2048)
+            if not data:
+                raise BadRequest()
+            size = len(data)
+            if LF == data[-1]:
+                if 0 == self.tail:
+                    if 2 == self.nl_len:
+                        if data.endswith(b'\r\n'):
+                            res = size - 2
+                            self.tail = 3
+                            if 0 == res:
+                                continue
+                            else:
+                                b[0:res] = memoryview(data)[0:res]
+                                return res
+                        else:
+                            b[0:size] = data
+                            assert 0 == self.tail
+                            return size
+                    else:
+                        assert 1 == self.nl_len
+                        res = size - 1
+                        self.tail = 2
                         if 0 == res:
-                            return self.readinto(b)
+                            continue
                         else:
-                            b[0:res] = data[0:res]
+                            b[0:res] = memoryview(data)[0:res]
                             return res
+                if size == self.next_len and \
+                   data == self.next_    and \
+                   self.tail == self.nl_state:
+                    self.tail = 0
+                    self.met_EOF = True
+                    return 0
+                if size == self.stop_len and \
+                   data == self.stop_    and \
+                   self.tail == self.nl_state:
+                    if self.rw.left != 0:
+                        raise BadRequest()
+                    self.tail = 0
+                    self.met_EOF = True
+                    return 0
+                if 2 == self.nl_len:
+                    if data.endswith(b'\r\n'):
+                        tail_len = _TAIL_LEN[self.tail]
+                        data_len = size - 2
+                        res = tail_len + data_len
+                        b[0:tail_len] = _TAIL_BYTES[self.tail]
+                        b[tail_len:res] = memoryview(data)[0:data_len]
+                        self.tail = 3
+                        assert res > 0
+                        return res
+                    elif 1 == self.tail and b'\n' == data:
+                        self.tail = 3
+                        continue
                     else:
-                        b[0:size] = data
-                        assert self.tail is None
-                        return size
+                        tail_len = _TAIL_LEN[self.tail]
+                        res = tail_len + size
+                        b[0:tail_len] = _TAIL_BYTES[self.tail]
+                        b[tail_len:res] = data
+                        self.tail = 0
+                        assert res > 0
+                        return res
                 else:
                     assert 1 == self.nl_len
-                    res = size - 1
-                    self.tail = b'\n'
-                    if 0 == res:
-                        return self.readinto(b)
+                    b[0:1] = b'\n'
+                    b[1:size] = memoryview(data)[0:size-1]
+                    assert 2 == self.tail
+                    assert size > 0
+                    return size
+            elif 2 == self.nl_len:
+                if 0 == self.tail:
+                    if CR == data[-1]:
+                        res = size - 1
+                        self.tail = 1
+                        if 0 == res:
+                            continue
+                        else:
+                            b[0:res] = memoryview(data)[0:res]
+                            return res
                     else:
-                        b[0:res] = data[0:res]
-                        return res
-            if size == self.next_len and \
-               data == self.next_    and \
-               self.tail == self.nl:
-                self.tail = None
-                self.met_EOF = True
-                return 0
-            if size == self.stop_len and \
-               data == self.stop_    and \
-               self.tail == self.nl:
-                if self.rw.left != 0:
-                    raise BadRequest()
-                self.tail = None
-                self.met_EOF = True
-                return 0
-            if 2 == self.nl_len:
-                if size > 1 and b'\r\n' == data[size-2:size]:
-                    tail_len = len(self.tail)
-                    data_len = size - 2
+                        b[0:size] = data
+                        assert 0 == self.tail
+                        assert size > 0
+                        return size
+                if CR == data[-1]:
+                    tail_len = _TAIL_LEN[self.tail]
+                    data_len = size - 1
                     res = tail_len + data_len
-                    b[0:tail_len] = self.tail
-                    b[tail_len:res] = data[0:data_len]
-                    self.tail = b'\r\n'
+                    b[0:tail_len] = _TAIL_BYTES[self.tail]
+                    b[tail_len:res] = memoryview(data)[0:data_len]
+                    self.tail = 1
                     assert res > 0
                     return res
-                elif b'\r' == self.tail and b'\n' == data:
-                    self.tail = b'\r\n'
-                    return self.readinto(b)
                 else:
-                    tail_len = len(self.tail)
+                    tail_len = _TAIL_LEN[self.tail]
                     res = tail_len + size
-                    b[0:tail_len] = self.tail
+                    b[0:tail_len] = _TAIL_BYTES[self.tail]
                     b[tail_len:res] = data
-                    self.tail = None
+                    self.tail = 0
                     assert res > 0
                     return res
             else:
                 assert 1 == self.nl_len
-                b[0:1] = b'\n'
-                b[1:size] = data[0:size-1]
-                assert b'\n' == self.tail
-                assert size > 0
-                return size
-        elif 2 == self.nl_len:
-            if self.tail is None:
-                if CR == data[-1]:
-                    res = size - 1
-                    self.tail = b'\r'
-                    if 0 == res:
-                        return self.readinto(b)
-                    else:
-                        b[0:res] = data[0:res]
-                        return res
-                else:
+                if 0 == self.tail:
                     b[0:size] = data
-                    assert self.tail is None
+                    assert 0 == self.tail
                     assert size > 0
                     return size
-            if CR == data[-1]:
-                tail_len = len(self.tail)
-                data_len = size - 1
-                res = tail + data_len
-                b[0:tail_len] = self.tail
-                b[tail_len:res] = data[0:data_len]
-                self.tail = b'\r'
-                assert res > 0
-                return res
-            else:
-                tail_len = len(self.tail)
-                res = tail_len + size
-                b[0:tail_len] = self.tail
-                b[tail_len:res] = data
-                self.tail = None
-                assert res > 0
-                return res
+                else:
+                    assert 2 == self.tail
+                    res = size + 1
+                    b[0:1] = b'\n'
+                    b[1:res] = data
+                    self.tail = 0
+                    assert res > 0
+                    return res
+
+    def scan(self, b):
+        (   "scan("
+                "b:memoryview"
+            ") -> int" """
+
+        Copy the buffered content that can not be a part of the boundary
+        line into `b` with a single search, returns 0 if the line-based
+        parser has to take over.
+        """)
+        left = self.rw.left
+        if left <= 0 or self.rw.closed:
+            return 0
+        window = self.peek(1)[:min(left, len(b))]
+        p = window.find(self.delimiter)
+        if -1 == p:
+            size = len(window) - self.delimiter_len + 1
         else:
-            assert 1 == self.nl_len
-            if self.tail is None:
-                b[0:size] = data
-                assert self.tail is None
-                assert size > 0
-                return size
-            else:
-                assert b'\n' == self.tail
-                res = size + 1
-                b[0:1] = b'\n'
-                b[1:res] = data
-                self.tail = None
-                assert res > 0
-                return res
+            size = p
+        if size <= 0:
+            return 0
+        b[0:size] = self.rw.read(size)
+        return size
 
     def readable(self):
         return True
@@ -367,5 +573,12 @@ class BadRequest(urllib.error.HTTPError):
     def __init__(self, msg='Bad Request'):
         urllib.error.HTTPError.__init__(self, None, 400, msg, None, None)
 
+# The parsed parameters are shared between the callers, do not modify.
+_parse_header = functools.lru_cache(maxsize=256)(cgi.parse_header)
+
 CR = ord(b'\r')
 LF = ord(b'\n')
+
+# MultipartRawIO.tail states: 0 nothing held back, 1 CR, 2 LF, 3 CRLF.
+_TAIL_LEN   = (0, 1, 1, 2)
+_TAIL_BYTES = (b'', b'\r', b'\n', b'\r\n')
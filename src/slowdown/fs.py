@@ -9,6 +9,7 @@ This module provides cooperative versions of the **os** and **os.path**
 module, base on the **gevent.threadpool.ThreadPool** .
 """
 
+import functools
 import gevent
 import gevent.fileobject
 import io
@@ -70,20 +71,29 @@ class IOOpen(object):
                       **kwds
             )
 
+def cooperative(func):
+    (   "cooperative("
+            "func:Callable"
+        ") -> Callable" """
+
+    Returns a function that runs `func` in the threadpool of the current
+    hub.
+    """)
+    get_hub = gevent.get_hub
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwds):
+        return get_hub().threadpool.apply(func, args, kwds)
+
+    return wrapper
+
 os_all = '''\
 access,chmod,chown,close,closerange,fchmod,fchown,fstat,fstatvfs,ftruncate\
 ,fwalk,lchown,link,listdir,lstat,makedirs,mkdir,open,remove,removedirs,ren\
 ame,renames,rmdir,stat,unlink,walk'''.split(',')
 os_all = [name for name in os_all if hasattr(os, name)]
 for name in os_all:
-    exec ('''\
-from os import {name} as original_os_{name}
-def os_{name}(*args, **kwds):
-    return \\
-        gevent.get_hub().threadpool.apply(
-            original_os_{name}, args, kwds
-        )
-os_{name}.__doc__ = original_os_{name}.__doc__'''.format(name=name))
+    globals()['os_'+name] = cooperative(getattr(os, name))
 path_all = '''\
 abspath,exists,getatime,getctime,getmtime,getsize,isdir,isfile,islink,ismo\
 unt,lexists,realpath,relpath'''.split(',')
@@ -105,14 +115,7 @@ class OS(object):
 
 path_all = [name for name in path_all if hasattr(os.path, name)]
 for name in path_all:
-    exec ('''\
-from os.path import {name} as original_path_{name}
-def path_{name}(*args, **kwds):
-    return \\
-        gevent.get_hub().threadpool.apply(
-            original_path_{name}, args, kwds
-        )
-path_{name}.__doc__ = original_path_{name}.__doc__'''.format(name=name))
+    globals()['path_'+name] = cooperative(getattr(os.path, name))
 
 class Path(object):
 
@@ -8,7 +8,7 @@
 
 from . import logging
 
-__all__ = ['logger']
+__all__ = ['levels', 'logger']
 
 levels = [logging.DISABLED, logging.INFO, logging.DEBUG]
 logger = logging.Logger()
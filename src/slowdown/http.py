@@ -65,6 +65,10 @@ Examples:
         # `None` will be returned if there are no cookies exists.
         cookie = rw.cookie  # `http.cookies.SimpleCookie` object
 
+        # Get the cookie values only, an empty dict is returned if there
+        # are no cookies.
+        values = rw.cookies  # `dict` object
+
         # Set cookies
         new_cookie = http.cookies.SimpleCookie()
         new_cookie['key'] = 'value'
@@ -102,11 +106,13 @@ Example::
 """
 
 import errno
+import functools
 import gevent
 import gevent.socket
 import gevent.ssl
 import html
 import http.cookies
+import os
 import random
 import re
 import sys
@@ -122,6 +128,12 @@ default_mime_type = 'application/octet-stream'
 header_parsing_timeout = 60.
 max_keep_alive = 300.
 
+# The size of the reads when a file cannot be handed to os.sendfile().
+sendfile_blocksize = 0x10000
+
+# Linux only.
+TCP_CORK = getattr(gevent.socket, 'TCP_CORK', None)
+
 __all__ = ['File', 'Handler', 'new_environ']
 
 class File(object):
@@ -139,17 +151,28 @@ class File(object):
                  'headers_sent',
                  'left',
                  'reader',
-                 'socket']
+                 'scheme',
+                 'socket',
+                 '_cookie',
+                 '_cookies',
+                 '_sendall']
 
     def __init__(self, socket, reader, environ):
         self.socket  = socket   #: The original socket object
         self.reader  = reader   #: The reading stream
         self.environ = environ  #: The HTTP headers
         self.left    = environ['locals.content_length']
+
+        #: 'https' for SSL sockets, otherwise 'http'
+        self.scheme  = \
+            'https' if isinstance(socket, gevent.ssl.SSLSocket) else 'http'
         self.chunked = False
         self.closed  = False
         self.headers_sent = None
         self.disconnected = False
+        self._cookie  = None
+        self._cookies = None
+        self._sendall = socket.sendall
 
     @property
     def cookie(self):
@@ -159,10 +182,28 @@ class File(object):
         :rtype: http.cookies.SimpleCookie
         """
 
-        cookie_str = self.environ.get('HTTP_COOKIE')
-        if cookie_str is None:
-            return None
-        return http.cookies.SimpleCookie(cookie_str)
+        cookie = self._cookie
+        if cookie is None:
+            cookie_str = self.environ.get('HTTP_COOKIE')
+            if cookie_str is None:
+                return None
+            cookie = self._cookie = http.cookies.SimpleCookie(cookie_str)
+        return cookie
+
+    @property
+    def cookies(self):
+        """
+        Accessing cookies as a dict of names and values, which is cheaper
+        than :attr:`cookie` if the morsel attributes are not needed.
+
+        :rtype: Dict[str, str]
+        """
+
+        cookies = self._cookies
+        if cookies is None:
+            cookies = self._cookies = \
+                parse_cookie(self.environ.get('HTTP_COOKIE', ''))
+        return cookies
 
     def start_response(self, status='200 OK', headers=None, cookie=None):
         (   "start_response("
@@ -177,23 +218,14 @@ class File(object):
             raise BrokenPipeError(errno.EPIPE, 'Broken pipe')
         if self.headers_sent is not None:
             raise RuntimeError('header already sent')
-        b_status  = as_bytes(status, http_header_encoding)
-        b_version = as_bytes(self.environ['SERVER_PROTOCOL'],
-                             http_header_encoding)
-        buf = [b'%s %s' % (b_version, b_status)]
-        if headers is not None:
-            for key, value in headers:
-                b_key   = as_bytes(  key, http_header_encoding)
-                b_value = as_bytes(value, http_header_encoding)
-                buf.append(b'%s: %s' % (urlencode.quote(b_key), b_value))
-        if cookie is not None:
-            assert isinstance(cookie, http.cookies.BaseCookie)
-            for dummy, morsel in sorted(cookie.items()):
-                value   = morsel.OutputString()
-                b_value = as_bytes(value, http_header_encoding)
-                buf.append(b'Set-Cookie: ' + b_value)
-        buf.append(b'\r\n')
-        self.socket.sendall(b'\r\n'.join(buf))
+        buf = \
+            build_headers(
+                status_line(self.environ['SERVER_PROTOCOL'], status),
+                headers,
+                cookie
+            )
+        buf += b'\r\n'
+        self._sendall(buf)
         self.headers_sent = status
 
     def start_chunked(self, status='200 OK', headers=None, cookie=None):
@@ -209,24 +241,15 @@ class File(object):
             raise BrokenPipeError(errno.EPIPE, 'Broken pipe')
         if self.headers_sent is not None:
             raise RuntimeError('header already sent')
-        b_status  = as_bytes(status)
-        b_version = as_bytes(self.environ['SERVER_PROTOCOL'],
-                             http_header_encoding)
-        buf = [b'%s %s' % (b_version, b_status),
-               b'Transfer-Encoding: chunked']
-        if headers is not None:
-            for key, value in headers:
-                b_key   = as_bytes(  key, http_header_encoding)
-                b_value = as_bytes(value, http_header_encoding)
-                buf.append(b'%s: %s' % (urlencode.quote(b_key), b_value))
-        if cookie is not None:
-            assert isinstance(cookie, http.cookies.BaseCookie)
-            for dummy, morsel in sorted(cookie.items()):
-                value   = morsel.OutputString()
-                b_value = as_bytes(value, http_header_encoding)
-                buf.append(b'Set-Cookie: ' + b_value)
-        buf.append(b'\r\n')
-        self.socket.sendall(b'\r\n'.join(buf))
+        buf = \
+            build_headers(
+                status_line(self.environ['SERVER_PROTOCOL'], status) +
+                b'Transfer-Encoding: chunked\r\n',
+                headers,
+                cookie
+            )
+        buf += b'\r\n'
+        self._sendall(buf)
         self.headers_sent = status
         self.chunked = True
 
@@ -243,27 +266,18 @@ class File(object):
             raise BrokenPipeError(errno.EPIPE, 'Broken pipe')
         if self.headers_sent is not None:
             raise RuntimeError('header already sent')
-        b_status  = as_bytes(status)
-        b_version = as_bytes(self.environ['SERVER_PROTOCOL'],
-                             http_header_encoding)
-        buf = [b'%s %s' % (b_version, b_status)]
-        if headers is not None:
-            for key, value in headers:
-                b_key   = as_bytes(  key, http_header_encoding)
-                b_value = as_bytes(value, http_header_encoding)
-                buf.append(b'%s: %s' % (urlencode.quote(b_key), b_value))
-        if cookie is not None:
-            assert isinstance(cookie, http.cookies.BaseCookie)
-            for dummy, morsel in sorted(cookie.items()):
-                value   = morsel.OutputString()
-                b_value = as_bytes(value, http_header_encoding)
-                buf.append(b'Set-Cookie: ' + b_value)
+        buf = \
+            build_headers(
+                status_line(self.environ['SERVER_PROTOCOL'], status),
+                headers,
+                cookie
+            )
         if content is None:
-            buf.append(b'\r\n')
+            buf += b'\r\n'
+            self._sendall(buf)
         else:
-            buf.append(b'Content-Length: %d\r\n' % len(content))
-            buf.append(content)
-        self.socket.sendall(b'\r\n'.join(buf))
+            buf += b'Content-Length: %d\r\n\r\n' % len(content)
+            send_buffers(self.socket, [buf, content])
         self.headers_sent = status
         self.closed = True
 
@@ -281,42 +295,37 @@ class File(object):
             raise BrokenPipeError(errno.EPIPE, 'Broken pipe')
         if self.headers_sent is not None:
             raise RuntimeError('header already sent')
-        b_status  = as_bytes(status)
-        b_version = as_bytes(self.environ['SERVER_PROTOCOL'],
-                             http_header_encoding)
-        buf = [b'%s %s' % (b_version, b_status)]
-        if headers is not None:
-            for key, value in headers:
-                b_key   = as_bytes(  key, http_header_encoding)
-                b_value = as_bytes(value, http_header_encoding)
-                buf.append(b'%s: %s' % (urlencode.quote(b_key), b_value))
-        if cookie is not None:
-            assert isinstance(cookie, http.cookies.BaseCookie)
-            for dummy, morsel in sorted(cookie.items()):
-                value   = morsel.OutputString()
-                b_value = as_bytes(value, http_header_encoding)
-                buf.append(b'Set-Cookie: ' + b_value)
+        buf = \
+            build_headers(
+                status_line(self.environ['SERVER_PROTOCOL'], status),
+                headers,
+                cookie
+            )
         if content is None:
-            buf.append(b'\r\n')
+            buf += b'\r\n'
+            self._sendall(buf)
         else:
             if   isinstance(content, bytes):
                 b_content = content
             elif isinstance(content, str):
                 if encoding is None:
                     encoding = sys.getdefaultencoding()
-                b_content = as_bytes(content, encoding)
+                b_content = content.encode(encoding)
             else:
                 raise TypeError('expected binary or unicode string, '
                                 'got {!r}'.format(content))
-            if encoding is None:
-                buf.append(b'Content-Type: text/html\r\n'
-                           b'Content-Length: %d\r\n' % len(b_content))
-            else:
-                buf.append(b'Content-Type: text/html; charset: %s\r\n'
-                           b'Content-Length: %d\r\n'
-                           % (as_bytes(encoding), len(b_content)))
-            buf.append(b_content)
-        self.socket.sendall(b'\r\n'.join(buf))
+            buf += html_content_fields(encoding) % len(b_content)
+            send_buffers(self.socket, [buf, b_content])
+        self.headers_sent = status
+        self.closed = True
+
+    def _send_prepared_and_close(self, status, data):
+        if self.closed:
+            raise BrokenPipeError(errno.EPIPE, 'Broken pipe')
+        if self.headers_sent is not None:
+            raise RuntimeError('header already sent')
+        first = status_line(self.environ['SERVER_PROTOCOL'], status)
+        self._sendall(first + data)
         self.headers_sent = status
         self.closed = True
 
@@ -337,6 +346,25 @@ class File(object):
         self.left = left - len(data)
         return data
 
+    def readinto(self, b):
+        (   "readinto("
+                "b:bytearray"
+            ") -> int" """
+
+        Read the HTTP content into the writable buffer `b` and return the
+        number of bytes read. Large contents can be received without
+        creating new bytes objects.
+        """)
+        if self.closed:
+            return 0
+        view = memoryview(b).cast('B')
+        left = self.left
+        if len(view) > left:
+            view = view[:left]
+        size = self.reader.readinto(view)
+        self.left = left - size
+        return size
+
     def readline(self, size=-1):
         (    "readline("
                 "size:int=-1"
@@ -363,9 +391,13 @@ class File(object):
         if self.closed:
             raise BrokenPipeError(errno.EPIPE, 'Broken pipe')
         if self.chunked:
-            self.socket.sendall(b'%x\r\n%s\r\n' % (len(data), data))
+
+            # An empty chunk would terminate the body.
+            if data:
+                send_buffers(self.socket,
+                             [b'%x\r\n' % len(data), data, b'\r\n'])
         else:
-            self.socket.sendall(data)
+            self._sendall(data)
 
     def sendall(self, data):
         (   "sendall("
@@ -377,9 +409,62 @@ class File(object):
         if self.closed:
             raise BrokenPipeError(errno.EPIPE, 'Broken pipe')
         if self.chunked:
-            self.socket.sendall(b'%x\r\n%s\r\n' % (len(data), data))
+
+            # An empty chunk would terminate the body.
+            if data:
+                send_buffers(self.socket,
+                             [b'%x\r\n' % len(data), data, b'\r\n'])
         else:
-            self.socket.sendall(data)
+            self._sendall(data)
+
+    def sendfile(self, file, offset=0, count=None):
+        (   "sendfile("
+                "file:BinaryIO, "
+                "offset:int=0, "
+                "count:int=None"
+            ") -> int" """
+
+        Send `count` bytes of a regular file from `offset` to client,
+        or up to the end of the file if `count` is None, returns the
+        number of bytes sent. Plain sockets are served by
+        `os.sendfile()`, SSL sockets by reading the file in blocks of
+        `sendfile_blocksize` bytes. Not available in chunked mode.
+        """)
+        if self.closed:
+            raise BrokenPipeError(errno.EPIPE, 'Broken pipe')
+        if self.chunked:
+            raise RuntimeError('sendfile() is not available in chunked '
+                               'mode')
+        if count is None:
+            count = os.fstat(file.fileno()).st_size - offset
+        socket = self.socket
+        sent   = 0
+        if isinstance(socket, gevent.ssl.SSLSocket) or \
+           not hasattr(os, 'sendfile'):
+            file.seek(offset)
+            while sent < count:
+                data = file.read(min(count - sent, sendfile_blocksize))
+                if not data:
+                    break
+                self._sendall(data)
+                sent += len(data)
+            return sent
+        out_fd  = socket.fileno()
+        in_fd   = file.fileno()
+        timeout = socket.gettimeout()
+        while sent < count:
+            try:
+                size = os.sendfile(out_fd, in_fd, offset + sent,
+                                   count - sent)
+            except BlockingIOError:
+                gevent.socket.wait_write(out_fd, timeout)
+                continue
+
+            # The file is shorter than expected.
+            if 0 == size:
+                break
+            sent += size
+        return sent
 
     def flush(self):
         """
@@ -397,7 +482,7 @@ class File(object):
             - **False** complete the current request and keep alive
         """)
         if self.chunked and not self.closed:
-            self.socket.sendall(b'0\r\n\r\n')
+            self._sendall(b'0\r\n\r\n')
         if disconnect:
             self.reader.close()
             self.socket.close()
@@ -414,6 +499,16 @@ class File(object):
         """)
         self.send_response_and_close('304 Not Modified', headers, content)
 
+    def not_modified_prepared(self, fields):
+        (   "not_modified_prepared("
+                "fields:bytes"
+            ") -> None" """
+
+        304 Not Modified, with `fields` as the already encoded header
+        fields, ending in the blank line.
+        """)
+        self._send_prepared_and_close('304 Not Modified', fields)
+
     def bad_request(self, headers=None, content=None):
         (   "bad_request("
                 "headers:List[Tuple[str, str]]=None, "
@@ -422,11 +517,16 @@ class File(object):
 
         400 Bad Request.
         """)
-        if content is None:
+        if content is None and headers is None:
+            self._send_prepared_and_close(
+                '400 Bad Request',
+                prepared_html(http_400_content, http_content_encoding)
+            )
+        elif content is None:
             self.send_html_and_close(
                 '400 Bad Request',
                 headers,
-                http_400_content,
+                http_400_content_bytes,
                 encoding=http_content_encoding
             )
         else:
@@ -445,12 +545,14 @@ class File(object):
         403 Forbidden.
         """)
         if content is None:
+            prefix, suffix = http_403_content_parts
             content = \
-                http_403_content_template.format(
-                    html.escape(
-                        urllib.parse.unquote(self.environ['REQUEST_URI'])
-                    )
-                )
+                b''.join([
+                    prefix,
+                    escape_uri(self.environ['REQUEST_URI'])
+                        .encode(http_content_encoding),
+                    suffix
+                ])
             self.send_html_and_close(
                 '403 Forbidden',
                 headers,
@@ -473,12 +575,14 @@ class File(object):
         404 Not Found.
         """)
         if content is None:
+            prefix, suffix = http_404_content_parts
             content = \
-                http_404_content_template.format(
-                    html.escape(
-                        urllib.parse.unquote(self.environ['REQUEST_URI'])
-                    )
-                )
+                b''.join([
+                    prefix,
+                    escape_uri(self.environ['REQUEST_URI'])
+                        .encode(http_content_encoding),
+                    suffix
+                ])
             self.send_html_and_close(
                 '404 Not Found',
                 headers,
@@ -501,10 +605,14 @@ class File(object):
         405 Method Not Allowed.
         """)
         if content is None:
+            prefix, suffix = http_405_content_parts
             content = \
-                http_405_content_template.format(
+                b''.join([
+                    prefix,
                     self.environ['REQUEST_METHOD']
-                )
+                        .encode(http_content_encoding),
+                    suffix
+                ])
             self.send_html_and_close(
                 '405 Method Not Allowed',
                 headers,
@@ -526,11 +634,16 @@ class File(object):
 
         413 Request Entity Too Large.
         """)
-        if content is None:
+        if content is None and headers is None:
+            self._send_prepared_and_close(
+                '413 Request Entity Too Large',
+                prepared_html(http_413_content, http_content_encoding)
+            )
+        elif content is None:
             self.send_html_and_close(
                 '413 Request Entity Too Large',
                 headers,
-                http_413_content,
+                http_413_content_bytes,
                 encoding=http_content_encoding
             )
         else:
@@ -548,11 +661,16 @@ class File(object):
 
         414 Request-URI Too Large.
         """)
-        if content is None:
+        if content is None and headers is None:
+            self._send_prepared_and_close(
+                '414 Request-URI Too Large',
+                prepared_html(http_414_content, http_content_encoding)
+            )
+        elif content is None:
             self.send_html_and_close(
                 '414 Request-URI Too Large',
                 headers,
-                http_414_content,
+                http_414_content_bytes,
                 encoding=http_content_encoding
             )
         else:
@@ -570,11 +688,16 @@ class File(object):
 
         500 Internal Server Error.
         """)
-        if content is None:
+        if content is None and headers is None:
+            self._send_prepared_and_close(
+                '500 Internal Server Error',
+                prepared_html(http_500_content, http_content_encoding)
+            )
+        elif content is None:
             self.send_html_and_close(
                 '500 Internal Server Error',
                 headers,
-                http_500_content,
+                http_500_content_bytes,
                 encoding=http_content_encoding
             )
         else:
@@ -592,10 +715,7 @@ class File(object):
             host = self.environ['HTTP_HOST']
         except KeyError:
             return self.bad_request()
-        if isinstance(self.socket, gevent.ssl.SSLSocket):
-            base = 'https://%s/' % host
-        else:
-            base = 'http://%s/'  % host
+        base = '%s://%s/' % (self.scheme, host)
         if url_encoding is None:
             url_encoding = sys.getdefaultencoding()
         if isinstance(urls, (list, tuple, set)):
@@ -618,19 +738,21 @@ class File(object):
             else:
                 headers.append(('Location', location[1]))
             if content is None:
-                hrefs = \
-                    ''.join(
-                        http_30X_multiple_urls_href_template.format(
-                            u_location,
-                            urlencode.quote(b_location)
-                                     .decode(http_header_encoding)
-                        ) for u_location, b_location in locations
-                    )
-                content = multiple_urls_template.format(hrefs)
+                quote    = urlencode.quote
+                encoding = http_content_encoding
+                parts    = template_parts(multiple_urls_template, encoding)
+                (href_0, href_1, href_2) = \
+                    template_parts(http_30X_multiple_urls_href_template,
+                                   encoding)
+                chunks = [parts[0]]
+                for u_location, b_location in locations:
+                    chunks += [href_0, u_location.encode(encoding),
+                               href_1, quote(b_location), href_2]
+                chunks.append(parts[1])
                 self.send_html_and_close(
                     status,
                     headers,
-                    content.encode(http_content_encoding),
+                    b''.join(chunks),
                     encoding=http_content_encoding,
                 )
             else:
@@ -655,16 +777,21 @@ class File(object):
             else:
                 headers.append(('Location', b_location))
             if content is None:
+                (part_0, part_1, part_2) = \
+                    template_parts(single_url_template,
+                                   http_content_encoding)
                 content = \
-                    single_url_template.format(
-                        u_location,
-                        urlencode.quote(b_location)
-                                 .decode(http_header_encoding)
-                    )
+                    b''.join([
+                        part_0,
+                        u_location.encode(http_content_encoding),
+                        part_1,
+                        urlencode.quote(b_location),
+                        part_2
+                    ])
                 self.send_html_and_close(
                     status,
                     headers,
-                    content.encode(http_content_encoding),
+                    content,
                     encoding=http_content_encoding
                 )
             else:
@@ -832,19 +959,22 @@ class Handler(object):
                 if not rw.closed or rw.disconnected:
                     return
                 if environ.get('HTTP_CONNECTION', '') \
-                          .lower() == 'keep_alive':
+                          .lower() == 'keep-alive':
                     keep_alive = environ.get('HTTP_KEEP_ALIVE', '300')
                 else:
                     keep_alive = environ.get('HTTP_KEEP_ALIVE')
-                if keep_alive is None or \
-                   not regx_keep_alive.match(keep_alive):
+                try:
+                    n_keep_alive = int(keep_alive)
+                except (TypeError, ValueError):
+                    return
+                if n_keep_alive <= 0:
                     return
                 left = rw.left
-                if 8192 > left > 0:
-                    reader.read(left)
+                if 0 < left < 8192:
+                    left -= len(reader.read(left))
                 if left != 0:
                     return
-                n_keep_alive = min(int(keep_alive), max_keep_alive)
+                n_keep_alive = min(n_keep_alive, max_keep_alive)
                 try:
                     gevent.socket.wait_read(socket.fileno(), n_keep_alive)
                 except:
@@ -871,11 +1001,14 @@ def new_environ(reader, server_side=True):
             data = reader.readline(4096)
             if b'' == data:
                 raise BrokenPipeError(errno.EPIPE, 'Broken pipe')
-            match = regx_first_header_server_side.match(data)
-            if match is None:
-                size += len(data)
-                continue
-            (b_method, b_uri, b_version) = match.groups()
+            request_line = parse_request_line(data)
+            if request_line is None:
+                match = regx_first_header_server_side.match(data)
+                if match is None:
+                    size += len(data)
+                    continue
+                request_line = match.groups()
+            (b_method, b_uri, b_version) = request_line
             if b_method:
                 break
             else:
@@ -883,10 +1016,12 @@ def new_environ(reader, server_side=True):
                 continue
         else:
             raise ValueError('Invalid http headers')
-        environ = \
-            {    'REQUEST_URI': b_uri.decode(http_header_encoding),
-              'REQUEST_METHOD': b_method.decode(http_header_encoding),
-             'SERVER_PROTOCOL': b_version.decode(http_header_encoding)}
+        # Copying a template with every key the server side always sets
+        # yields a dict that is already sized for them.
+        environ = server_environ_template.copy()
+        environ[    'REQUEST_URI'] = b_uri.decode(http_header_encoding)
+        environ[ 'REQUEST_METHOD'] = b_method.decode(http_header_encoding)
+        environ['SERVER_PROTOCOL'] = b_version.decode(http_header_encoding)
     else:
         size = 0
         while size < 8192:
@@ -909,54 +1044,44 @@ def new_environ(reader, server_side=True):
             { 'RESPONSE_STATUS': b_status.decode(http_header_encoding),
              'RESPONSE_MESSAGE': b_message.decode(http_header_encoding),
               'SERVER_PROTOCOL': b_version.decode(http_header_encoding)}
-    data = reader.readline(2048)
-    size = len(data)
-    while 1:
-        match = regx_headers.match(data)
-        if match is None:
-            if b'\r\n' == data or b'\n' == data:
-                break
-            raise ValueError('Invalid http headers')
-        (b_key, b_value) = match.groups()
-        key = b_key.decode(http_header_encoding) \
-                   .replace('-', '_') \
-                   .upper()
-        environ['HTTP_' + key] = b_value.decode(http_header_encoding)
-        data = reader.readline(2048)
-        size += len(data)
-        if size > 8192:
-            raise ValueError('Request header is too large')
-    if 'HTTP_CONTENT_LENGTH' in environ:
-        environ['CONTENT_LENGTH'] = environ.get('HTTP_CONTENT_LENGTH', 0)
-        left = environ.get('HTTP_CONTENT_LENGTH', '0').strip()
-        if len(left) > 16:
-            raise ValueError('Content-Length is too large')
-        n_left = int(left)
-        if n_left < 0 or n_left > 0x2386f26fc0ffff:
-            raise ValueError('Invalid Content-Length')
-        environ['locals.content_length'] = n_left
-    else:
+    read_headers(reader, environ)
+    left = environ.get('HTTP_CONTENT_LENGTH')
+    if left is None:
         environ['locals.content_length'] = 0
+    else:
+        environ['CONTENT_LENGTH'] = left
+        # Up to 16 plain digits can not exceed 0x2386f26fc0ffff.
+        if len(left) <= 16 and left.isdigit():
+            environ['locals.content_length'] = int(left)
+        else:
+            left = left.strip()
+            if len(left) > 16:
+                raise ValueError('Content-Length is too large')
+            n_left = int(left)
+            if n_left < 0 or n_left > 0x2386f26fc0ffff:
+                raise ValueError('Invalid Content-Length')
+            environ['locals.content_length'] = n_left
     if server_side:
         p = b_uri.find(b'?')
         if p != -1:
+            b_path = b_uri[:p]
+        else:
+            b_path = b_uri
+
+        # Most paths have nothing to unquote.
+        if -1 == b_path.find(b'%'):
+            b_path_info = b_path
+        else:
             b_path_info = \
                 b'%2F'.join(
                     urlencode.unquote(x)
-                        for x in regx_quoted_slash.split(b_uri[:p])
+                        for x in regx_quoted_slash.split(b_path)
                 )
-            environ['PATH_INFO'] = \
-                b_path_info.decode(http_header_encoding)
+        environ['PATH_INFO'] = b_path_info.decode(http_header_encoding)
+        if p != -1:
             environ['QUERY_STRING'] = \
                 b_uri[p+1:].decode(http_header_encoding)
         else:
-            b_path_info = \
-                b'%2F'.join(
-                    urlencode.unquote(x)
-                        for x in regx_quoted_slash.split(b_uri)
-                )
-            environ['PATH_INFO'] = \
-                b_path_info.decode(http_header_encoding)
             environ['QUERY_STRING'] = ''
     environ['SCRIPT_NAME'] = ''
     environ.setdefault(
@@ -965,12 +1090,271 @@ def new_environ(reader, server_side=True):
     )
     return environ
 
+def parse_cookie(cookie_str):
+    (   "parse_cookie("
+            "cookie_str:str"
+        ") -> Dict[str, str]"
+    )
+    cookies = {}
+    for item in cookie_str.split(';'):
+        key, sep, value = item.partition('=')
+        if not sep:
+            continue
+        value = value.strip()
+        if len(value) > 1 and '"' == value[0] == value[-1]:
+            value = value[1:-1]
+        cookies[key.strip()] = value
+    return cookies
+
+def build_headers(head, headers, cookie):
+    (   "build_headers("
+            "head:bytes, "
+            "headers:List[Tuple[str, str]], "
+            "cookie:http.cookies.SimpleCookie"
+        ") -> bytearray" """
+
+    Returns the header lines following `head`, which are the header
+    fields and the cookies, each line is terminated by CRLF.
+    """)
+    buf = bytearray(head)
+    if headers is not None:
+        for key, value in headers:
+            b_key   = as_bytes(  key, http_header_encoding)
+            b_value = as_bytes(value, http_header_encoding)
+            if b_key.translate(None, header_key_chars):
+                b_key = urlencode.quote(b_key)
+            buf += b_key
+            buf += b': '
+            buf += b_value
+            buf += b'\r\n'
+    if cookie is not None:
+        assert isinstance(cookie, http.cookies.BaseCookie)
+        for morsel in cookie.values():
+            value   = morsel.OutputString()
+            b_value = as_bytes(value, http_header_encoding)
+            buf += b'Set-Cookie: '
+            buf += b_value
+            buf += b'\r\n'
+    return buf
+
+@functools.lru_cache(maxsize=256)
+def status_line(version, status):
+    (   "status_line("
+            "version:Union[str,bytes], "
+            "status:Union[str,bytes]"
+        ") -> bytes" """
+
+    The first line of the response, e.g. b'HTTP/1.1 200 OK\\r\\n'. Only a
+    few combinations are used in practice, so the result is cached.
+    """)
+    return b'%s %s\r\n' % (as_bytes(version, http_header_encoding),
+                           as_bytes( status, http_header_encoding))
+
+@functools.lru_cache(maxsize=64)
+def prepared_html(content, encoding):
+    (   "prepared_html("
+            "content:str, "
+            "encoding:str"
+        ") -> bytes" """
+
+    The header fields and the body of a text/html response whose content
+    never changes, such as the built-in error pages.
+    """)
+    b_content = content.encode(encoding)
+    return html_content_fields(encoding) % len(b_content) + b_content
+
+@functools.lru_cache(maxsize=64)
+def template_parts(template, encoding):
+    (   "template_parts("
+            "template:str, "
+            "encoding:str"
+        ") -> Tuple[bytes, ...]" """
+
+    The encoded pieces of a page template around its '{}' placeholders,
+    so that filling it in is a single bytes join.
+    """)
+    parts = template.split('{}')
+    for part in parts:
+        if '{' in part or '}' in part:
+            raise ValueError(f'unsupported template {template!r}')
+    return tuple(part.encode(encoding) for part in parts)
+
+@functools.lru_cache(maxsize=64)
+def html_content_fields(encoding):
+    (   "html_content_fields("
+            "encoding:str"
+        ") -> bytes" """
+
+    The template of the Content-Type and the Content-Length fields of a
+    text/html response, formatted with the length of the content.
+    """)
+    if encoding is None:
+        return b'Content-Type: text/html\r\nContent-Length: %d\r\n\r\n'
+    return (b'Content-Type: text/html; charset: ' + as_bytes(encoding) +
+            b'\r\nContent-Length: %d\r\n\r\n')
+
+def set_cork(socket, on):
+    (   "set_cork("
+            "socket:gevent.socket.socket, "
+            "on:bool"
+        ") -> bool" """
+
+    Switch the TCP_CORK option of the socket, returns False if it is not
+    supported.
+    """)
+    if TCP_CORK is None:
+        return False
+    try:
+        socket.setsockopt(gevent.socket.IPPROTO_TCP, TCP_CORK, on)
+    except (AttributeError, OSError):
+        return False
+    return True
+
+def send_buffers(socket, buffers):
+    (   "send_buffers("
+            "socket:gevent.socket.socket, "
+            "buffers:List[bytes]"
+        ") -> None" """
+
+    Send all the `buffers` in order. They are handed to the kernel as a
+    scatter-gather list without being joined if the socket supports
+    **sendmsg**.
+    """)
+    if isinstance(socket, gevent.ssl.SSLSocket) or \
+       not hasattr(socket, 'sendmsg'):
+        socket.sendall(b''.join(buffers))
+        return
+    buffers = list(buffers)
+    while buffers:
+        sent = socket.sendmsg(buffers)
+
+        # Drop what has been sent, the rest is sent again.
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers.pop(0))
+        if sent > 0:
+            buffers[0] = memoryview(buffers[0])[sent:]
+
+def read_headers(reader, environ, encoding=None):
+    (   "read_headers("
+            "reader:io.BufferedReader, "
+            "environ:dict, "
+            "encoding:str=None"
+        ") -> dict" """
+
+    Read the header fields up to the empty line into `environ`, which is
+    returned, as 'HTTP_*' keys. Used for both the HTTP messages and the
+    parts of the multipart messages.
+    """)
+    if encoding is None:
+        encoding = http_header_encoding
+    for line in read_header_lines(reader):
+        p = line.find(b':')
+        if -1 == p or -1 != line.find(b'\r'):
+            raise ValueError('Invalid http headers')
+        b_key = line[:p].lstrip(b' \t')
+
+        # Whitespace between the field name and the colon must be
+        # rejected (RFC 7230 3.2.4), otherwise 'Content-Length : 5'
+        # would be honoured where a proxy in front may ignore it.
+        if not b_key or b_key.endswith((b' ', b'\t')):
+            raise ValueError('Invalid http headers')
+        b_value = line[p+1:].strip(b' \t')
+        environ[header_key(b_key, encoding)] = b_value.decode(encoding)
+    return environ
+
+def read_header_lines(reader):
+    (   "read_header_lines("
+            "reader:io.BufferedReader"
+        ") -> List[bytes]" """
+
+    Read the lines of the header fields up to the empty line, without the
+    line endings. If the whole CRLF terminated block is already buffered
+    it is taken with one read, otherwise line by line.
+    """)
+    peek = getattr(reader, 'peek', None)
+    if peek is not None:
+        data = peek(8192)
+        if data.startswith(b'\r\n'):
+            end = 2
+        else:
+            end = data.find(b'\r\n\r\n') + 4
+        if 3 != end and end <= 8192 and \
+           data.count(b'\n', 0, end) == data.count(b'\r\n', 0, end):
+            lines = reader.read(end).split(b'\r\n')[:-2]
+            for line in lines:
+                if len(line) > 2046:
+                    raise ValueError('Invalid http headers')
+            return lines
+    lines = []
+    data = reader.readline(2048)
+    size = len(data)
+    while 1:
+        if data.endswith(b'\r\n'):
+            line = data[:-2]
+        elif data.endswith(b'\n'):
+            line = data[:-1]
+        else:
+            raise ValueError('Invalid http headers')
+        if not line:
+            return lines
+        lines.append(line)
+        data = reader.readline(2048)
+        size += len(data)
+        if size > 8192:
+            raise ValueError('Request header is too large')
+
+@functools.lru_cache(maxsize=256)
+def header_key(b_key, encoding):
+    (   "header_key("
+            "b_key:bytes, "
+            "encoding:str"
+        ") -> str" """
+
+    The environ key of a header field, e.g. b'Content-Type' becomes
+    'HTTP_CONTENT_TYPE'. The same few names recur, so they are cached.
+    """)
+    return 'HTTP_' + b_key.translate(header_key_table).decode(encoding)
+
+def parse_request_line(data):
+    (   "parse_request_line("
+            "data:bytes"
+        ") -> Tuple[bytes, bytes, bytes]" """
+
+    Split a well-formed request line such as b'GET / HTTP/1.1\\r\\n' into
+    the method, the URI and the version. None is returned for anything
+    else, which is left to `regx_first_header_server_side`.
+    """)
+    if data.endswith(b'\r\n'):
+        line = data[:-2]
+    elif data.endswith(b'\n'):
+        line = data[:-1]
+    else:
+        return None
+    i = line.find(b' ')
+    j = line.rfind(b' ')
+    if i <= 0 or j - i < 2:
+        return None
+    b_method  = line[:i]
+    b_uri     = line[i+1:j]
+    b_version = line[j+1:]
+    if b_version not in http_versions or not b_method.isalpha() or \
+       b_uri[0] in b' \t' or b'\r' in b_uri:
+        return None
+    return (b_method, b_uri, b_version)
+
 def translate_url(base, url):
-    if is_absolute_url.search(url):
+    if url.startswith(('http://', 'https://')) or \
+       is_absolute_url.search(url):
         return url
     if not base.endswith('/'):
         base = base + '/'
     url = url.lstrip('/')
+    if '//' not in url and '/.' not in url and not url.startswith('.'):
+        # No empty, '.' or '..' segments, nothing to normalize.
+        result = base + url
+        if result.startswith('//'):
+            return result[1:]
+        return result
     p = url.rfind('/')
     if -1 == p:
         result = base + url
@@ -996,12 +1380,25 @@ def translate_url(base, url):
         return result[1:]
     return result
 
+def escape_uri(uri):
+    (   "escape_uri("
+            "uri:str"
+        ") -> str" """
+
+    Unquote the `uri` and escape it for HTML, most URIs need neither.
+    """)
+    if regx_uri_specials.search(uri) is None:
+        return uri
+    return html.escape(urllib.parse.unquote(uri))
+
 def as_bytes(string, encoding=None):
     (   "as_bytes("
             "string:Union[str,bytes], "
             "encoding:str=None"
         ") -> bytes"
     )
+    if type(string) is bytes:
+        return string
     if   isinstance(string, str):
         return \
             string.encode(
@@ -1015,22 +1412,36 @@ def as_bytes(string, encoding=None):
                 f'expected binary or unicode string, got {repr(string)}'
             )
 
-regx_quoted_slash = re.compile(br'(?:i)%2F')
-regx_headers = \
-    re.compile(
-        br'^[\s\t]*([^\r\n:]+)[\s\t]*:[\s\t]*([^\r\n]*)[\s\t]*\r?\n$'
-    )
+# Header names made of these characters are left as is by `quote()`.
+header_key_chars = \
+    b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_.~/'
+# Upper-cases the ASCII letters of a header name and maps '-' to '_',
+# field names are ASCII tokens (RFC 7230, section 3.2).
+header_key_table = \
+    bytes.maketrans(b'abcdefghijklmnopqrstuvwxyz-',
+                    b'ABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+regx_quoted_slash = re.compile(br'%2F', re.I)
+regx_uri_specials = re.compile(r'[%&<>"\']')
 regx_first_header_server_side = \
     re.compile((
         br'^(?:[ \t]*(\w+)[ \t]+([^\r\n]+)[ \t]+(HTTP/[0-2]\.[0-9])[ \t]*|'
         br'[ \t]*)\r?\n$'
     ), re.I)
+http_versions = \
+    frozenset(b'HTTP/%d.%d' % (x, y) for x in range(3) for y in range(10))
+server_environ_template = \
+    {          'REQUEST_URI': '',
+            'REQUEST_METHOD': '',
+           'SERVER_PROTOCOL': '',
+                 'PATH_INFO': '',
+              'QUERY_STRING': '',
+               'SCRIPT_NAME': '',
+     'locals.content_length': 0}
 regx_first_header_client_side = \
     re.compile((
         br'^(?:[ \t]*(HTTP/[0-2]\.[0-9])[ \t]+([0-9]+)[ \t]+([^\r\n]+)[ \t'
         br']*|[ \t]*)\r?\n$'
     ), re.I)
-regx_keep_alive = re.compile(r'^\s*[1-9][0-9]{0,6}\s*$')
 is_absolute_url = re.compile(r'http://|https://|ftp://|ftps://|file://')
 http_400_content = '''\
 <html><head><title>400 Bad Request</title></head><body><h1>Bad Request</h1\
@@ -1068,6 +1479,20 @@ http_500_content = '''\
 nal Server Error</h1><p>The server encountered an internal error and was u\
 nable to complete your request.</p><hr /><address>Python-{}.{}.{}</address\
 ></body></html>'''.format(*sys.version_info)
+http_400_content_bytes = http_400_content.encode(http_content_encoding)
+http_413_content_bytes = http_413_content.encode(http_content_encoding)
+http_414_content_bytes = http_414_content.encode(http_content_encoding)
+http_500_content_bytes = http_500_content.encode(http_content_encoding)
+# The encoded pages split around their single placeholder.
+http_403_content_parts = \
+    tuple(http_403_content_template.encode(http_content_encoding)
+                                   .split(b'{}'))
+http_404_content_parts = \
+    tuple(http_404_content_template.encode(http_content_encoding)
+                                   .split(b'{}'))
+http_405_content_parts = \
+    tuple(http_405_content_template.encode(http_content_encoding)
+                                   .split(b'{}'))
 http_30X_single_url_template = '''\
 <html><head><meta http-equiv="Content-Type" content="text/html; charset={}\
 "><title>{{}}</title></head><body><p>{{}} <a href="{{{{}}}}">{{{{}}}}</a><\
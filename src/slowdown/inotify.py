@@ -3,7 +3,6 @@
 """A simple Python wrapper around inotify."""
 
 import ctypes
-import ctypes.util
 import errno
 import gevent.socket
 import io
@@ -12,6 +11,8 @@ import os.path
 import struct
 import sys
 
+from . import sysutil
+
 IN_ACCESS        = 0x00000001  # File was accessed.
 IN_MODIFY        = 0x00000002  # File was modified.
 IN_ATTRIB        = 0x00000004  # Metadata changed.
@@ -91,7 +92,7 @@ __all__ = ['Inotify',
 
 class Inotify(object):
 
-    __slots__ = ['cbs', 'encoding', 'fd', 'reader']
+    __slots__ = ['buffer_size', 'cbs', 'encoding', 'fd']
 
     def __init__(self, maxevents=None, buffer_size=None, encoding=None):
         self.fd = libc.inotify_init1(IN_NONBLOCK)
@@ -99,12 +100,12 @@ class Inotify(object):
             err = ctypes.get_errno()
             raise OSError(err, os.strerror(err))
         self.cbs = {}
-        if maxevents is None:
-            maxevents = default_maxevents
-        raw = InotifyEventRawIo(self.fd, maxevents=maxevents)
+        # `maxevents` is kept for compatibility, the kernel hands out
+        # as many whole events as fit in `buffer_size` bytes.
         if buffer_size is None:
             buffer_size = default_buffer_size
-        self.reader = io.BufferedReader(raw, buffer_size)
+        # A read must fit at least one event with the longest name.
+        self.buffer_size = max(buffer_size, inotify_event_len + 256)
         if encoding is None:
             self.encoding = default_fs_encoding
         else:
@@ -115,7 +116,6 @@ class Inotify(object):
             return
         for wd, dummy in self.cbs.items():
             libc.inotify_rm_watch(self.fd, wd)
-        self.reader.close()
         try:
             os.close(self.fd)
         except:
@@ -134,6 +134,31 @@ class Inotify(object):
         self.cbs[wd] = callback
         return wd
 
+    def batch_add_watch(self, names, mask, callback):
+        (   "batch_add_watch("
+                "names:Iterable[Union[str,bytes]], "
+                "mask:int, "
+                "callback:Callable"
+            ") -> Dict[int, Union[str,bytes]]" """
+
+        Watch every path in `names` with the same mask and callback,
+        returns a dict that maps each watch descriptor to its path. A
+        path that is already watched keeps its watch descriptor.
+        """)
+        fd        = self.fd
+        encoding  = self.encoding
+        add_watch = libc.inotify_add_watch
+        cbs       = self.cbs
+        watches   = {}
+        for name in names:
+            wd = add_watch(fd, as_bytes(name, encoding) + b'\0', mask)
+            if -1 == wd:
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err))
+            cbs[wd] = callback
+            watches[wd] = name
+        return watches
+
     def rm_watch(self, wd):
         if wd not in self.cbs:
             raise KeyError(wd)
@@ -141,31 +166,21 @@ class Inotify(object):
         del self.cbs[wd]
 
     def poll(self):
-        data = self.reader.read(inotify_event_len)
-        (wd, mask, cookie, len_) = struct.unpack(inotify_event_fmt, data)
-        name = self.reader.read(len_).rstrip(b'\0').decode(self.encoding)
-        if wd in self.cbs:
-            self.cbs[wd](wd, mask, cookie, name)
-
-class InotifyEventRawIo(io.RawIOBase):
-
-    def __init__(self, fd, maxevents=None):
-        io.RawIOBase.__init__(self)
-        self.fd = fd
-        if maxevents is None:
-            self.maxevents = default_maxevents
-        else:
-            self.maxevents = maxevents
-
-    def readinto(self, b):
         gevent.socket.wait_read(self.fd)
-        data = os.read(self.fd, self.maxevents)
+        try:
+            data = os.read(self.fd, self.buffer_size)
+        except BlockingIOError:
+            return
+        cbs    = self.cbs
         length = len(data)
-        b[0:length] = data
-        return length
-
-    def readable(self):
-        return True
+        pos    = 0
+        while pos < length:
+            (wd, mask, cookie, len_) = inotify_event_unpack_from(data, pos)
+            pos += inotify_event_len
+            name = data[pos:pos + len_].rstrip(b'\0').decode(self.encoding)
+            pos += len_
+            if wd in cbs:
+                cbs[wd](wd, mask, cookie, name)
 
 class Broken(object):
 
@@ -176,6 +191,8 @@ def as_bytes(string, encoding=None):
     """
     as_bytes(string:Union[str,bytes], encoding:str=None) -> bytes
     """
+    if type(string) is bytes:
+        return string
     if   isinstance(string, str):
         return \
             string.encode(
@@ -189,30 +206,9 @@ def as_bytes(string, encoding=None):
                 f'expected binary or unicode string, got {repr(string)}'
         )
 
-def find_library(name):
-    where = ctypes.util.find_library(name)
-    if where is not None:
-        return where
-    root = 'lib' + name
-    dn = os.path.dirname(__file__)
-    base = os.path.abspath(dn)
-    for fn in os.listdir(base):
-        items = fn.split('.')
-        if len(items) > 1 and items[0] == root and \
-           items[1] in ('so', 'dll', 'dylib'):
-            where = os.path.join(base, fn)
-            if os.path.isfile(where):
-                return where
-
-def load_library(name, use_errno=True):
-    where = find_library(name)
-    if where is None:
-        raise RuntimeError('needs lib{} installed.'.format(name))
-    return ctypes.CDLL(where, use_errno=use_errno)
-
 try:
-    libc = load_library('c')
-    c_uint32_t = ctypes.c_uint
+    libc = sysutil.load_library('c')
+    c_uint32_t = ctypes.c_uint32
 
     # Create and initialize inotify instance.
     libc.inotify_init.argtypes = ()
@@ -234,6 +230,7 @@ try:
 
     inotify_event_fmt = 'iIII'
     inotify_event_len = struct.calcsize(inotify_event_fmt)
+    inotify_event_unpack_from = struct.Struct(inotify_event_fmt).unpack_from
 except (RuntimeError, AttributeError):
     libc    = None
     Inotify = Broken
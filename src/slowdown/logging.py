@@ -23,6 +23,7 @@ Example:
 import gevent
 import gevent.queue
 import os.path
+import string
 import sys
 import time
 import weakref
@@ -30,6 +31,7 @@ import weakref
 from logging import CRITICAL, DEBUG, ERROR, FATAL, INFO, NOTSET, WARNING
 
 default_file_queue_maxsize = 2048
+default_write_buffer_size  = 0x10000
 
 __all__ = ['File', 'Logger', 'RotatingFile']
 
@@ -50,6 +52,88 @@ default_strftime_fmt  = '%Y-%m-%d %H:%M:%S'
 default_errorlog_fmt  = '{time} {level} {msg}'
 default_accesslog_fmt = '{time} {msg}'
 
+# Tags of the items queued by `File` for `syncer`.
+FLUSH = 0
+WRITE = 1
+CLOSE = 2
+
+# fmt -> (epoch second, formatted string)
+_strftime_cache = {}
+
+def strftime(fmt):
+    (   "strftime("
+            "fmt:str"
+        ") -> str" """
+
+    Same as `time.strftime(fmt)`, but the result is reused until the
+    current second changes.
+    """)
+    now    = int(time.time())
+    cached = _strftime_cache.get(fmt)
+    if cached is not None and cached[0] == now:
+        return cached[1]
+    formatted = time.strftime(fmt, time.localtime(now))
+    _strftime_cache[fmt] = (now, formatted)
+    return formatted
+
+def compile_template(fmt, fields):
+    (   "compile_template("
+            "fmt:str, "
+            "fields:Tuple[str, ...]"
+        ") -> Callable[[tuple], str]" """
+
+    Turn the `str.format()` template `fmt` into a function that takes
+    the values of `fields` as one tuple. A template that names exactly
+    these fields once each, in this order, without conversions or
+    format specs becomes a '%' template, anything else is still handed
+    to `str.format()`.
+    """)
+    parts = []
+    names = []
+    plain = True
+    for literal, name, spec, conversion in string.Formatter().parse(fmt):
+        parts.append(literal.replace('%', '%%'))
+        if name is not None:
+            if spec or conversion:
+                plain = False
+            parts.append('%s')
+            names.append(name)
+    if plain and tuple(names) == fields:
+        return ''.join(parts).__mod__
+    format = fmt.format
+    return lambda values: format(**dict(zip(fields, values)))
+
+def compile_errorlog_template(fmt, level_name):
+    (   "compile_errorlog_template("
+            "fmt:str, "
+            "level_name:str"
+        ") -> Callable[[tuple], str]" """
+
+    Same as `compile_template(fmt, ('time', 'msg'))` with `level_name`
+    written in place of every bare '{level}' field. If `level` is used
+    with a conversion or a format spec, the template is left to
+    `str.format()` with all three fields.
+    """)
+    parts = []
+    for literal, name, spec, conversion in string.Formatter().parse(fmt):
+        parts.append(literal.replace('{', '{{').replace('}', '}}'))
+        if name is None:
+            continue
+        if 'level' == name:
+            if spec or conversion:
+                format = fmt.format
+                return lambda values: \
+                    format(time=values[0], level=level_name, msg=values[1])
+            parts.append(level_name.replace('{', '{{').replace('}', '}}'))
+        else:
+            field = name
+            if conversion:
+                field += '!' + conversion
+            if spec:
+                field += ':' + spec
+            parts.append('{' + field + '}')
+    return compile_template(''.join(parts), ('time', 'msg'))
+
 class Logger(object):
 
     (   "Logger("
@@ -62,7 +146,9 @@ class Logger(object):
         ")"
     )
     __slots__ = ['accesslog_fmt',
+                 'accesslog_tmpl',
                  'errorlog_fmt',
+                 'errorlog_tmpls',
                  'file',
                  'immediately',
                  'level',
@@ -99,6 +185,15 @@ class Logger(object):
                 (value, key) for key, value in
                 levelcode.items()
            )
+        # The level name is fixed per level, so bake it into one
+        # template per level and leave only time and msg to fill in.
+        self.errorlog_tmpls = \
+            dict(
+                (level, compile_errorlog_template(self.errorlog_fmt, name))
+                for level, name in self.level_name_map.items()
+            )
+        self.accesslog_tmpl = \
+            compile_template(self.accesslog_fmt, ('time', 'msg'))
 
     def access(self, msg):
         (   "access("
@@ -107,14 +202,12 @@ class Logger(object):
 
         Log a message on the access log.
         """)
-        self.file.write(
-            self.accesslog_fmt.format(
-                time=time.strftime(self.strftime_fmt),
-                msg=msg
-            )
+        file = self.file
+        file.write(
+            self.accesslog_tmpl((strftime(self.strftime_fmt), msg))
         )
         if self.immediately:
-            self.file.flush()
+            file.flush()
 
     def critical(self, msg):
         (   "critical("
@@ -187,15 +280,12 @@ class Logger(object):
             self._log_error(DEBUG, msg)
 
     def _log_error(self, level, msg):
-        self.file.write(
-            self.errorlog_fmt.format(
-                time=time.strftime(self.strftime_fmt),
-                level=self.level_name_map[level],
-                msg=msg
-            )
+        file = self.file
+        file.write(
+            self.errorlog_tmpls[level]((strftime(self.strftime_fmt), msg))
         )
         if self.immediately:
-            self.file.flush()
+            file.flush()
 
 class RotatingFile(object):
 
@@ -237,12 +327,12 @@ class RotatingFile(object):
     def write(self, data):
         if self.closed:
             raise ValueError('I/O operation on closed file.')
-        path = time.strftime(self.fmt)
+        path = strftime(self.fmt)
         if self.curr == path:
             self.file.write(data)
         else:
             file      = self.file
-            self.curr = time.strftime(self.fmt)
+            self.curr = path
             self.file = \
                 File(
                     self.fs,
@@ -258,12 +348,12 @@ class RotatingFile(object):
     def flush(self):
         if self.closed:
             raise ValueError('I/O operation on closed file.')
-        path = time.strftime(self.fmt)
+        path = strftime(self.fmt)
         if self.curr == path:
             self.file.flush()
         else:
             file      = self.file
-            self.curr = time.strftime(self.fmt)
+            self.curr = path
             self.file = \
                 File(
                     self.fs,
@@ -302,6 +392,7 @@ class File(object):
                  'encoding',
                  'file',
                  'filename',
+                 'flush_pending',
                  'queue',
                  'syncer',
                  '__weakref__']
@@ -314,6 +405,7 @@ class File(object):
         self.encoding = encoding
         self.filename = filename
         self.closed = False
+        self.flush_pending = False
         self.syncer = gevent.spawn(syncer, weakref.ref(self))
 
     def __del__(self):
@@ -324,46 +416,74 @@ class File(object):
         if self.closed:
             raise ValueError('I/O operation on closed file.')
         if isinstance(data, str):
-            self.queue.put(data.encode(self.encoding))
-        else:
-            self.queue.put(data)
+            data = data.encode(self.encoding)
+        if data:
+            self.queue.put((WRITE, data))
 
     def flush(self):
         if self.closed:
             raise ValueError('I/O operation on closed file.')
-        self.queue.put('')
+        # One queued FLUSH also covers the lines written after it, since
+        # the syncer defers the flush until the queue is drained.
+        if not self.flush_pending:
+            self.flush_pending = True
+            self.queue.put((FLUSH, None))
 
     def close(self):
         if not self.closed:
-            self.file.close()
             self.closed = True
-            self.queue.put(None)
+            self.queue.put((CLOSE, None))
             self.syncer.join()
+            self.file.close()
 
 def syncer(_logfile):
     its_time_to_flush = False
+    pending = None
     while True:
         logfile = _logfile()
         if logfile is None:
             return
-        try:
-            data = logfile.queue.get()
-        except gevent.GreenletExit as err:
-            logfile.file.close()
-            logfile.closed = True
-            return
-        except:
-            logfile.file.close()
-            logfile.closed = True
-            raise
-        if data:
+        if pending is None:
+            try:
+                tag, data = logfile.queue.get()
+            except gevent.GreenletExit as err:
+                logfile.file.close()
+                logfile.closed = True
+                return
+            except:
+                logfile.file.close()
+                logfile.closed = True
+                raise
+        else:
+            tag, data = pending
+            pending = None
+        if WRITE == tag:
+            queue = logfile.queue
+            if not queue.empty():
+                # Coalesce the lines already queued into one write, a
+                # FLUSH met on the way is done once the queue is empty.
+                chunks = [data]
+                size   = len(data)
+                while size < default_write_buffer_size and \
+                      not queue.empty():
+                    item = queue.get_nowait()
+                    if FLUSH == item[0]:
+                        logfile.flush_pending = False
+                        its_time_to_flush = True
+                        continue
+                    if WRITE != item[0]:
+                        pending = item
+                        break
+                    chunks.append(item[1])
+                    size += len(item[1])
+                data = b''.join(chunks)
             try:
                 logfile.file.write(data)
             except:
                 logfile.file.close()
                 logfile.closed = True
                 raise
-            if logfile.queue.empty() and its_time_to_flush:
+            if pending is None and queue.empty() and its_time_to_flush:
                 try:
                     logfile.file.flush()
                 except:
@@ -371,7 +491,8 @@ def syncer(_logfile):
                     logfile.closed = True
                     raise
                 its_time_to_flush = False
-        elif data is '':
+        elif FLUSH == tag:
+            logfile.flush_pending = False
             if logfile.queue.empty():
                 try:
                     logfile.file.flush()
@@ -382,7 +503,5 @@ def syncer(_logfile):
                 its_time_to_flush = False
             else:
                 its_time_to_flush = True
-        elif data is None:
-            return
         else:
-            raise TypeError('cannot handle this data type')
+            return
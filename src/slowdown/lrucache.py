@@ -19,9 +19,14 @@ Example:
     ...         expiration_time=600.,  # the expiration time of the data,
     ...                                # the default is 600 seconds.
     ...
-    ...         cleancycle=60.         # clear expired data at this
+    ...         cleancycle=60.,        # clear expired data at this
     ...                                # specified time, the default is
     ...                                # 60. seconds.
+    ...
+    ...         max_bytes=None,        # evict while the sum of the
+    ...         weight=None            # weight(value) of the data is
+    ...                                # greater than max_bytes, the
+    ...                                # default is no limit.
     ...     )
     >>> cache['A'] = DATA_1
     >>> cache['B'] = DATA_2
@@ -37,53 +42,41 @@ Example:
     None
 """
 
+import collections
 import time
 
-from . import exceptions
-
 default_cachesize             = 20000
 default_cache_cleancycle      = 60.
 default_cache_expiration_time = 600.
 
 __all__ = ['LRUCache']
 
-class Node(object):
-
-    __slots__ = ['defunct',
-                 'expires',
-                 'key',
-                 'next_',
-                 'prev_',
-                 'value']
-
-    def __init__(self, key):
-        self.next_   = None
-        self.prev_   = None
-        self.key     = key
-        self.value   = None
-        self.expires = 0.
-        self.defunct = 0
-
 class LRUCache(object):
 
     (   "LRUCache("
             "size:int=-1, "
             "expiration_time:float=-1, "
-            "cleancycle:float=-1"
+            "cleancycle:float=-1, "
+            "max_bytes:int=None, "
+            "weight:Callable[[Any], int]=None"
         ")" """
 
-    Dict-like Least Recently Used (LRU) cache.
+    Dict-like Least Recently Used (LRU) cache. If `max_bytes` and
+    `weight` are given, the least recently used values are also evicted
+    while the sum of their weights exceeds `max_bytes`.
     """)
 
     __slots__ = ['cleancycle',
                  'data',
-                 'head',
                  'expiration_time',
                  'expires',
+                 'max_bytes',
                  'size',
-                 'tail']
+                 'total',
+                 'weight']
 
-    def __init__(self, size=-1, expiration_time=-1, cleancycle=-1):
+    def __init__(self, size=-1, expiration_time=-1, cleancycle=-1,
+                 max_bytes=None, weight=None):
         if -1 == size:
             self.size = default_cachesize
         else:
@@ -96,51 +89,49 @@ class LRUCache(object):
             self.cleancycle = default_cache_cleancycle
         else:
             self.cleancycle = cleancycle
-        self.expires = time.time() + cleancycle
-        self.data = {}
-        self.head = Node(None)
-        self.tail = Node(None)
-        self.head.next_ = self.tail
-        self.tail.prev_ = self.head
+        if max_bytes is None or weight is None:
+            self.max_bytes = None
+            self.weight    = None
+        else:
+            self.max_bytes = max_bytes
+            self.weight    = weight
+        self.total   = 0
+        self.expires = time.monotonic() + self.cleancycle
+        # key -> [expires, value, weight], from the least to the most
+        # recently used, the ordering is kept by OrderedDict in C.
+        self.data = collections.OrderedDict()
 
     def __setitem__(self, key, value):
         """
         Set self[key] to value
         """
-        node = self.data.get(key, None)
-        if node is None:
-            node = Node(key)
-            self.data[key] = node
+        data   = self.data
+        now    = time.monotonic()
+        weight = 0 if self.weight is None else self.weight(value)
+        item   = data.get(key)
+        if item is None:
+            data[key] = [now + self.expiration_time, value, weight]
         else:
-            node_prev = node.prev_
-            node_next = node.next_
-            node_prev.next_ = node_next
-            node_next.prev_ = node_prev
-        now = time.time()
-        node.expires = now + self.expiration_time
-        node.value = value
-        tail = self.tail
-        tail_prev  = tail.prev_
-        node.prev_ = tail_prev
-        node.next_ = tail
-        tail_prev.next_ = node
-        tail.prev_ = node
-        if len(self.data) > self.size or now > self.expires:
+            self.total -= item[2]
+            item[0] = now + self.expiration_time
+            item[1] = value
+            item[2] = weight
+            data.move_to_end(key)
+        self.total += weight
+        if len(data) > self.size or now > self.expires or \
+           (self.max_bytes is not None and self.total > self.max_bytes):
             self.garbage_collect(now)
 
     def __delitem__(self, key):
         """
         Delete self[key]
         """
-        now = time.time()
+        now = time.monotonic()
         if now > self.expires:
             self.garbage_collect(now)
-        node = self.data.pop(key, None)
-        if node is not None:
-            node_prev = node.prev_
-            node_next = node.next_
-            node_prev.next_ = node_next
-            node_next.prev_ = node_prev
+        item = self.data.pop(key, None)
+        if item is not None:
+            self.total -= item[2]
 
     def __contains__(self, key):
         """
@@ -154,75 +145,54 @@ class LRUCache(object):
 
         remove specified key and return the corresponding value.
         """
-        now = time.time()
+        now = time.monotonic()
         if now > self.expires:
             self.garbage_collect(now)
-        node = self.data.pop(key, None)
-        if node is None:
+        item = self.data.pop(key, None)
+        if item is None:
             return default
         else:
-            node_prev = node.prev_
-            node_next = node.next_
-            node_prev.next_ = node_next
-            node_next.prev_ = node_prev
-            return node.value
+            self.total -= item[2]
+            return item[1]
 
     def get(self, key, default=None):
         """
         Return the value for key if key is in the dictionary, else default.
         """
-        node = self.data.get(key)
-        now = time.time()
-        if node is None:
+        item = self.data.get(key)
+        now = time.monotonic()
+        if item is None:
             if now > self.expires:
                 self.garbage_collect(now)
             return default
-        if now > node.expires:
+        if now > item[0]:
             self.garbage_collect(now)
             return default
-        node.expires = now + self.expiration_time
-        node_prev = node.prev_
-        node_next = node.next_
-        node_prev.next_ = node_next
-        node_next.prev_ = node_prev
-        tail = self.tail
-        tail_prev  = tail.prev_
-        node.prev_ = tail_prev
-        node.next_ = tail
-        tail_prev.next_ = node
-        tail.prev_ = node
+        item[0] = now + self.expiration_time
+        self.data.move_to_end(key)
         if now > self.expires:
             self.garbage_collect(now)
-        return node.value
+        return item[1]
 
     def garbage_collect(self, now):
         self.expires = now + self.cleancycle
         data = self.data
-        size = self.size
-        head = self.head
-        tail = self.tail
-        node = head.next_
-        exceptions_ = []
-        while node is not tail and now > node.expires:
-            key = node.key
-            try:
-                del data[key]
-            except KeyError as exc:
-                exceptions_.append(exc)
-            node  = node.next_
-            head.next_ = node
-            node.prev_ = head
-        while node is not tail and len(data) > size:
-            key = node.key
-            try:
-                del data[key]
-            except KeyError as exc:
-                exceptions_.append(exc)
-            node  = node.next_
-            head.next_ = node
-            node.prev_ = head
-        if exceptions_:
-            if 1 == len(exceptions_):
-                raise exceptions_[0]
+        # Entries are ordered by last use, so the expired ones come
+        # first.
+        expired = []
+        for key, item in data.items():
+            if now > item[0]:
+                expired.append(key)
             else:
-                raise exceptions.Exceptions(exceptions_)
+                break
+        total = self.total
+        for key in expired:
+            total -= data.pop(key)[2]
+        size = self.size
+        while len(data) > size:
+            total -= data.popitem(last=False)[1][2]
+        max_bytes = self.max_bytes
+        if max_bytes is not None:
+            while total > max_bytes and data:
+                total -= data.popitem(last=False)[1][2]
+        self.total = total
@@ -105,11 +105,11 @@ Script samples:
 
 import gevent
 import hashlib
-import io
 import mimetypes
 import os
 import os.path
 import stat
+import struct
 import time
 import types
 import weakref
@@ -123,9 +123,27 @@ default_index_html   = 'index.html'
 default_index_script = 'index.html'
 default_max_file_cache_size  = 0x200000
 default_static_files_cache_size = 20000
+default_static_files_cache_bytes = 0x8000000  # 64 files of the max size
 default_scripts_cache_size      = 20000
+default_not_found_cache_size    = 4096
 default_reader_blocksize = 4096
-buffer_size = 0x10000
+
+# Level 9 costs several times the CPU of 6 for a few percent smaller
+# output.
+zlib_level = 6
+
+# Content of these types is compressed already, deflating it again
+# costs CPU for no gain.
+incompressible_mime_types = ('application/gzip',
+                             'application/x-gzip',
+                             'application/zip',
+                             'audio/',
+                             'font/woff',
+                             'image/gif',
+                             'image/jpeg',
+                             'image/png',
+                             'image/webp',
+                             'video/')
 
 __all__ = ['Mapfs']
 
@@ -154,11 +172,13 @@ class Mapfs(object):
                  'index_html',
                  'index_script',
                  'max_file_cache_size',
+                 'not_found_cache',
                  'reloading_scripts',
                  'reloading_static_files',
                  'script_watchers',
                  'scripts',
                  'scripts_cache',
+                 'scripts_code_cache',
                  'static_files',
                  'static_file_watchers',
                  'static_files_cache',
@@ -194,12 +214,20 @@ class Mapfs(object):
             self.index_script = index_script
         self.reloading_static_files = 0.
         self.reloading_scripts = 0.
+        self.not_found_cache = \
+            lrucache.LRUCache(size=default_not_found_cache_size)
+        self.scripts_code_cache = \
+            lrucache.LRUCache(size=default_scripts_cache_size)
         if www:
             self.reload_static_files(immediate=True)
         else:
             self.static_files = set()
             self.static_files_cache = \
-                lrucache.LRUCache(size=default_static_files_cache_size)
+                lrucache.LRUCache(
+                         size=default_static_files_cache_size,
+                    max_bytes=default_static_files_cache_bytes,
+                       weight=cache_weight
+                )
         if cgi:
             self.reload_scripts(immediate=True)
         else:
@@ -229,7 +257,14 @@ class Mapfs(object):
         path_info  = environ.get('locals.path_info')
         if path_info is None:
             path_info = environ['PATH_INFO']
-        script_name = os.path.normpath('/' + path_info.lstrip('/'))
+
+        # normpath() is only needed when there is something to collapse
+        if '//' in path_info or '/.' in path_info or \
+           path_info.startswith('.'):
+            script_name = os.path.normpath('/' + path_info.lstrip('/'))
+        else:
+            script_name = '/' + path_info.strip('/')
+        method = environ['REQUEST_METHOD'].upper()
         if path_info.endswith('/'):
             if '/' == script_name:
                 path_info = '/' + self.index_html
@@ -244,18 +279,23 @@ class Mapfs(object):
                 if_none_match = environ.get('HTTP_IF_NONE_MATCH')
                 if if_none_match is not None and \
                    if_none_match == cache_.etag:
-                    if 'GET' == environ['REQUEST_METHOD'].upper():
-                        return rw.not_modified()
+                    if 'GET' == method:
+                        return rw.not_modified_prepared(cache_.not_modified)
                     else:
                         return rw.method_not_allowed()
             elif if_modified_since == cache_.last_modified:
-                if 'GET' == environ['REQUEST_METHOD'].upper():
-                    return rw.not_modified()
+                if 'GET' == method:
+                    return rw.not_modified_prepared(cache_.not_modified)
                 else:
                     return rw.method_not_allowed()
             return self.send_static_file_cache(rw, environ, cache_)
         if path_info in self.static_files:
             return self.cache_and_send_static_file(rw, environ, path_info)
+        # The scripts tried below depend on script_name, and a path that
+        # ends in '/' shares its path_info with the index file.
+        not_found_key = (method, script_name, path_info)
+        if not_found_key in self.not_found_cache:
+            return rw.not_found()
         for l_script_name, l_path_info in gen_routers(script_name):
             if l_script_name is None:
                 return rw.request_uri_too_large()
@@ -273,7 +313,6 @@ class Mapfs(object):
                    callable(module.initialize):
                     module.initialize(self)
                 self.scripts_cache[l_script_name] = module
-            method = environ['REQUEST_METHOD'].upper()
             handler = getattr(module, method, None)
             if handler is None or not callable(handler):
                 handler = getattr(module, 'HTTP', None)
@@ -283,6 +322,7 @@ class Mapfs(object):
             environ[  'locals.path_info'] = l_path_info
             return handler(rw)
         else:
+            self.not_found_cache[not_found_key] = True
             return rw.not_found()
 
     def load_script(self, script_name):
@@ -293,13 +333,26 @@ class Mapfs(object):
         if module is None:
             path = os.path.join(self.cgi_dir,
                                 l_script_name.strip('/') + '.py')
-            file_in = self.fs.open(path, 'rb')
-            try:
-                code_b = file_in.read()
-            finally:
-                file_in.close()
-            code   = code_b.decode()
+
+            # The compiled code outlives the module, so that a script
+            # dropped from scripts_cache is not parsed again unless the
+            # file has changed.
+            st     = self.fs.os.stat(path)
+            cached = self.scripts_code_cache.get(path)
+            if cached is not None and \
+               cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                code = cached[2]
+            else:
+                file_in = self.fs.open(path, 'rb')
+                try:
+                    code_b = file_in.read()
+                finally:
+                    file_in.close()
+                code = compile(code_b, path, 'exec')
+                self.scripts_code_cache[path] = \
+                    (st.st_mtime_ns, st.st_size, code)
             module = types.ModuleType('__main__')
+            module.__file__ = path
             exec (code, module.__dict__)
             self.scripts_cache[l_script_name] = module
             return module
@@ -320,25 +373,30 @@ class Mapfs(object):
             return rw.not_found()
         gmtime = time.gmtime(st.st_mtime)
         last_modified = \
-            '{}, {}-{}-{}'.format(
+            '%s, %d-%s-%d %02d:%02d:%02d GMT' % (
                 abbreviated_weekday_names[gmtime.tm_wday],
                 gmtime.tm_mday,
                 abbreviated_month_names[gmtime.tm_mon],
-                time.strftime('%Y %H:%M:%S GMT', gmtime)
+                gmtime.tm_year,
+                gmtime.tm_hour,
+                gmtime.tm_min,
+                gmtime.tm_sec
             )
         size = st.st_size
         etag = \
-            hashlib.md5(b'%s%d' % (
-                last_modified.encode(http.http_header_encoding),
-                size
-            )).hexdigest()
+            hashlib.blake2b(
+                pack_etag_source(st.st_mtime_ns, size, st.st_ino),
+                digest_size=8
+            ).hexdigest()
         if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
         if if_modified_since is None:
             if_none_match = environ.get('HTTP_IF_NONE_MATCH')
             if if_none_match is not None and if_none_match == etag:
-                return rw.not_modified()
+                return rw.not_modified_prepared(
+                    not_modified_fields(etag, last_modified))
         elif if_modified_since == last_modified:
-            return rw.not_modified()
+            return rw.not_modified_prepared(
+                not_modified_fields(etag, last_modified))
         ext = os.path.splitext(filename)[1].lower()
         mime_type = _mimetypes.get(ext, http.default_mime_type)
         try:
@@ -351,34 +409,46 @@ class Mapfs(object):
                            ('Content-Length', f'{size}'    ),
                            (          'Etag', etag         ),
                            ( 'Last-Modified', last_modified)]
-                rw.start_response(status='200 OK', headers=headers)
-                data = file_in.read(buffer_size)
-                while data:
-                    rw.write(data)
-                    data = file_in.read(buffer_size)
+
+                # The header and the body are known up front, so the
+                # socket is corked to let the header share a segment
+                # with the first bytes of the file.
+                corked = http.set_cork(rw.socket, True)
+                try:
+                    rw.start_response(status='200 OK', headers=headers)
+                    rw.sendfile(file_in, 0, size)
+                finally:
+                    if corked:
+                        http.set_cork(rw.socket, False)
                 return rw.close()
             finally:
                 file_in.close()
+        # The file is small enough to be cached, so it is read in one
+        # call, which sizes the result from fstat() and copies nothing.
         try:
-            file_out = io.BytesIO()
-            data = file_in.read(buffer_size)
-            while data:
-                file_out.write(data)
-                data = file_in.read(buffer_size)
+            rawdata = file_in.read()
         finally:
             file_in.close()
-        rawdata = file_out.getvalue()
         rawlen = len(rawdata)
-        rawheaders = [('Last-Modified', last_modified),
+        rawheaders = (('Last-Modified', last_modified),
                       ( 'Content-Type', mime_type    ),
-                      (         'Etag', etag         )]
-        zdata = zlib.compress(rawdata, 9)[2:-4]
-        zlen = len(zdata)
+                      (         'Etag', etag         ))
+
+        if mime_type.startswith(incompressible_mime_types):
+            zdata = None
+            zlen  = rawlen
+        else:
+            # Negative wbits gives a raw deflate stream, without the
+            # zlib header and checksum that would otherwise be sliced
+            # off.
+            compressor = zlib.compressobj(zlib_level, zlib.DEFLATED, -15)
+            zdata = compressor.compress(rawdata) + compressor.flush()
+            zlen = len(zdata)
         if rawlen - zlen > 1024:
-            zheaders = [(   'Last-Modified', last_modified),
+            zheaders = ((   'Last-Modified', last_modified),
                         (    'Content-Type', mime_type    ),
                         ('Content-Encoding', 'deflate'    ),
-                        (            'Etag', etag         )]
+                        (            'Etag', etag         ))
         else:
             zdata    = None
             zheaders = None
@@ -387,7 +457,8 @@ class Mapfs(object):
                        rawdata,
                        rawheaders,
                        zdata,
-                       zheaders)
+                       zheaders,
+                       not_modified_fields(etag, last_modified))
         self.static_files_cache[path_info] = cache_
         return self.send_static_file_cache(rw, environ, cache_)
 
@@ -409,41 +480,47 @@ class Mapfs(object):
             )
 
     def find_files(self, dir_, suffixes=None):
+        if suffixes is not None:
+            suffixes = tuple(suffixes)
         dirlen = len(dir_)
         files  = set()
         dirs   = {dir_}
-        for dirpath, dirnames, filenames in self.fs.os.walk(dir_):
-            if filenames:
-                base = dirpath[dirlen:]
-                if '' == base:
-                    base = '/'
-                if suffixes is None:
-                    for filename in filenames:
-                        ext = os.path.splitext(filename)[1].lower()
-                        if filename.startswith('.')    or \
-                           ext in ignore_ext  or \
-                           ext.endswith('~'):
-                            continue
-                        files.add(os.path.join(base, filename))
-                else:
-                    for filename in filenames:
-                        ext = os.path.splitext(filename)[1].lower()
-                        if filename.startswith('.')    or \
-                           ext in ignore_ext  or \
-                           ext.endswith('~'):
-                            continue
-                        for suffix in suffixes:
-                            p = len(filename) - len(suffix)
-                            if p > 0 and filename[p:] == suffix:
-                                files.add(
-                                    os.path.join(base, filename[:p])
-                                )
-                                break
-            if dirnames:
-                for dirname in dirnames:
-                    if dirname.startswith('.'):
+        stack  = [dir_]
+        while stack:
+            dirpath = stack.pop()
+            base    = dirpath[dirlen:]
+            try:
+                entries = os.scandir(dirpath)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    filename = entry.name
+                    if filename.startswith('.'):
+                        continue
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        dirs.add(entry.path)
+                        # like os.walk, symbolic links to directories are
+                        # watched but not followed
+                        if not entry.is_symlink():
+                            stack.append(entry.path)
+                        continue
+                    if filename.lower().endswith(ignore_suffixes):
                         continue
-                    dirs.add(os.path.join(dirpath, dirname))
+                    if suffixes is None:
+                        files.add(f'{base}/{filename}')
+                        continue
+                    if not filename.endswith(suffixes):
+                        continue
+                    for suffix in suffixes:
+                        p = len(filename) - len(suffix)
+                        if p > 0 and filename[p:] == suffix:
+                            files.add(f'{base}/{filename[:p]}')
+                            break
         return (files, dirs)
 
     def reload_static_files(self, immediate=False):
@@ -457,24 +534,32 @@ class Mapfs(object):
             while self.reloading_static_files > time.time():
                 gevent.sleep(reload_delay_time)
             self.reloading_static_files = 0.
-        while self.static_file_watchers:
-            (wd, dummy) = self.static_file_watchers.popitem()
-            try:
-                self.fs.inotify.rm_watch(wd)
-            except KeyError:
-                pass
         (files, dirs) = self.find_files(self.www_dir)
-        for dirname in dirs:
-            wd = \
-                self.fs.inotify.add_watch(
-                    dirname,
-                    mask_all,
-                    self.process_static_file_event
-                )
-            self.static_file_watchers[wd] = dirname
+
+        # Directories that are still there keep their watches, only the
+        # ones that are gone are removed.
+        watchers = \
+            self.fs.inotify.batch_add_watch(
+                dirs,
+                mask_all,
+                self.process_static_file_event
+            )
+        for wd in self.static_file_watchers:
+            if wd not in watchers:
+                try:
+                    self.fs.inotify.rm_watch(wd)
+                except KeyError:
+                    pass
+        self.static_file_watchers = watchers
         self.static_files = files
+        self.not_found_cache = \
+            lrucache.LRUCache(size=default_not_found_cache_size)
         self.static_files_cache = \
-            lrucache.LRUCache(size=default_static_files_cache_size)
+            lrucache.LRUCache(
+                     size=default_static_files_cache_size,
+                max_bytes=default_static_files_cache_bytes,
+                   weight=cache_weight
+            )
 
     def reload_scripts(self, immediate=False):
         if not immediate:
@@ -486,22 +571,26 @@ class Mapfs(object):
             while self.reloading_scripts > time.time():
                 gevent.sleep(reload_delay_time)
             self.reloading_scripts = 0.
-        while self.script_watchers:
-            (wd, dummy) = self.script_watchers.popitem()
-            try:
-                self.fs.inotify.rm_watch(wd)
-            except KeyError:
-                pass
         (files, dirs) = self.find_files(self.cgi_dir, suffixes)
-        for dirname in dirs:
-            wd = \
-                self.fs.inotify.add_watch(
-                    dirname,
-                    mask_all,
-                    self.process_script_event
-                )
-            self.script_watchers[wd] = dirname
+
+        # Directories that are still there keep their watches, only the
+        # ones that are gone are removed.
+        watchers = \
+            self.fs.inotify.batch_add_watch(
+                dirs,
+                mask_all,
+                self.process_script_event
+            )
+        for wd in self.script_watchers:
+            if wd not in watchers:
+                try:
+                    self.fs.inotify.rm_watch(wd)
+                except KeyError:
+                    pass
+        self.script_watchers = watchers
         self.scripts = files
+        self.not_found_cache = \
+            lrucache.LRUCache(size=default_not_found_cache_size)
         self.scripts_cache = \
             lrucache.LRUCache(size=default_scripts_cache_size)
 
@@ -510,8 +599,7 @@ class Mapfs(object):
             return
         if mask & inotify.IN_ISDIR:
             return self.reload_static_files()
-        ext = os.path.splitext(name)[1].lower()
-        if ext in ignore_ext or ext.endswith('~'):
+        if name.lower().endswith(ignore_suffixes):
             return
         dirname = self.static_file_watchers[wd]
         dirlen  = len(self.www_dir)
@@ -524,6 +612,8 @@ class Mapfs(object):
             del self.static_files_cache[l_path_info]
         if   mask & mask_modify:
             self.static_files.add(l_path_info)
+            self.not_found_cache = \
+                lrucache.LRUCache(size=default_not_found_cache_size)
         elif mask & mask_delete:
             if l_path_info in self.static_files:
                 self.static_files.remove(l_path_info)
@@ -546,59 +636,99 @@ class Mapfs(object):
         l_script_name = os.path.join(base, root)
         if l_script_name in self.scripts_cache:
             del self.scripts_cache[l_script_name]
+        path = os.path.join(dirname, name)
+        if path in self.scripts_code_cache:
+            del self.scripts_code_cache[path]
         if   mask & mask_modify:
             self.scripts.add(l_script_name)
+
+            # A new script may serve any path below it, so none of the
+            # remembered misses can be trusted any more.
+            self.not_found_cache = \
+                lrucache.LRUCache(size=default_not_found_cache_size)
         elif mask & mask_delete:
             if l_script_name in self.scripts:
                 self.scripts.remove(l_script_name)
 
 def gen_routers(request_uri_with_out_query_string, max_depth=32):
     assert request_uri_with_out_query_string.startswith('/')
-    script_name = request_uri_with_out_query_string = \
+    uri = request_uri_with_out_query_string = \
         os.path.normpath(request_uri_with_out_query_string)
-    depth = 0
-    while depth < max_depth:
-        path_info = request_uri_with_out_query_string[len(script_name):]
-        if path_info.startswith('/'):
-            yield (script_name, path_info)
-        else:
-            yield (script_name, '/' + path_info)
-        script_name, name = os.path.split(script_name)
-        if '/' == script_name or not name:
-            yield ('/', request_uri_with_out_query_string)
-            break
-        depth += 1
-    else:
+
+    # A normalized path has one '/' per segment, so a URI that is too
+    # deep is refused before any of its parents are tried.
+    if uri.count('/') > max_depth:
         yield (None, None)
+        return
+
+    # The parents are found by slicing at the last '/', the path is
+    # already normalized so this is what os.path.split() would return.
+    script_name = uri
+    while True:
+        yield (script_name, uri[len(script_name):] or '/')
+        p = script_name.rfind('/')
+        if p <= 0 or p == len(script_name) - 1:
+            yield ('/', uri)
+            break
+        script_name = script_name[:p]
 
 class Cache(object):
 
     __slots__ = ['etag',
                  'last_modified',
+                 'not_modified',
                  'rawdata',
                  'rawheaders',
                  'zdata',
                  'zheaders']
 
     def __init__(self, last_modified, etag, rawdata, rawheaders, zdata,
-                 zheaders):
+                 zheaders, not_modified):
         self.last_modified = last_modified
         self.etag = etag
         self.rawdata = rawdata
         self.rawheaders = rawheaders
         self.zdata = zdata
         self.zheaders = zheaders
+        self.not_modified = not_modified
+
+def cache_weight(cache_):
+    (   "cache_weight("
+            "cache_:Cache"
+        ") -> int" """
+
+    The number of bytes of file content held by a cache entry.
+    """)
+    if cache_.zdata is None:
+        return len(cache_.rawdata)
+    else:
+        return len(cache_.rawdata) + len(cache_.zdata)
+
+def not_modified_fields(etag, last_modified):
+    (   "not_modified_fields("
+            "etag:str, "
+            "last_modified:str"
+        ") -> bytes" """
+
+    The header fields of a 304 response, which carries the validators
+    of the cached entity and no body.
+    """)
+    return (f'Etag: {etag}\r\n'
+            f'Last-Modified: {last_modified}\r\n\r\n'
+           ).encode(http.http_header_encoding)
 
+# Indexed by tm_wday and tm_mon, locale independent unlike strftime().
 abbreviated_weekday_names = \
-    {0: 'Mon', 1: 'Tue', 2: 'Wed',  3: 'Thu',  4: 'Fri',  5: 'Sat',
-     6: 'Sun'}
+    ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
 abbreviated_month_names   = \
-    {1: 'Jan', 2: 'Feb', 3: 'Mar',  4: 'Apr',  5: 'May',  6: 'Jun',
-     7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
+    (None,  'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+            'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
 mask_modify = inotify.IN_CREATE | inotify.IN_MODIFY | inotify.IN_MOVED_TO
 mask_delete = inotify.IN_DELETE | inotify.IN_MOVED_FROM
 mask_all    = mask_modify | mask_delete
-ignore_ext = {'.swp', '.swx'}
+ignore_ext = frozenset(['.swp', '.swx'])
+ignore_suffixes = tuple(ignore_ext) + ('~',)
+pack_etag_source = struct.Struct('<qQQ').pack
 reload_delay_time = 2.
 suffixes = ['.py']
 if not mimetypes.inited:
@@ -8,6 +8,8 @@
 
 import ctypes
 import ctypes.util
+import functools
+import grp
 import os
 import os.path
 import platform
@@ -16,13 +18,62 @@ import sys
 
 UNAME_SYSNAME = platform.system()
 
+# Name service lookups may go as far as LDAP, successful ones are kept
+# for the life of the process. Failures are not, so that an account
+# added later is still found.
+_uid_cache = {}
+_gid_cache = {}
+
+libc_sonames = {'Darwin' : 'libc.dylib',
+                'FreeBSD': 'libc.so.7',
+                'Linux'  : 'libc.so.6'}
+_libraries = {}
+
+@functools.lru_cache(maxsize=1)
 def cpu_count():
     if  'Windows' == UNAME_SYSNAME:
         return int(os.environ['NUMBER_OF_PROCESSORS'])
     elif 'Darwin' == UNAME_SYSNAME:
-        return int(os.popen('sysctl -n hw.ncpu').read())
+        # asks the kernel directly instead of running sysctl(8)
+        return os.cpu_count()
     else:
-        return os.sysconf('SC_NPROCESSORS_ONLN')
+        count = os.sysconf('SC_NPROCESSORS_ONLN')
+
+        # In a container the host's processors are seen, bound them by
+        # the affinity mask and the cgroup quota.
+        if hasattr(os, 'sched_getaffinity'):
+            count = min(count, len(os.sched_getaffinity(0)))
+        limit = cgroup_cpu_limit()
+        if limit is not None:
+            count = min(count, limit)
+        return max(count, 1)
+
+def cgroup_cpu_limit():
+    (   "cgroup_cpu_limit("
+        ") -> Optional[int]" """
+
+    The number of processors allowed by the CPU quota of the current
+    cgroup, rounded up, or None if there is no quota.
+    """)
+    try:
+        # cgroup v2: "$MAX $PERIOD", $MAX may be "max"
+        with open('/sys/fs/cgroup/cpu.max') as file_in:
+            (quota, period) = file_in.read().split()[:2]
+        if 'max' == quota:
+            return None
+        (quota, period) = (int(quota), int(period))
+    except (OSError, ValueError):
+        try:
+            # cgroup v1, the quota is -1 if there is no limit
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as file_in:
+                quota = int(file_in.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as file_in:
+                period = int(file_in.read())
+        except (OSError, ValueError):
+            return None
+    if quota <= 0 or period <= 0:
+        return None
+    return -(-quota // period)
 
 def chown(path, user=None, group=None):
     if user is None:
@@ -52,35 +103,42 @@ def setuid(user):
     os.setuid(uid)
 
 def getuid(user):
+    uid = _uid_cache.get(user)
+    if uid is not None:
+        return uid
     if isinstance(user, int):
         try:
             pwrec = pwd.getpwuid(user)
         except LookupError:
             raise LookupError('uid {!r} not found'.format(user))
-        return user
+        uid = user
     else:
         try:
             pwrec = pwd.getpwnam(user)
         except LookupError:
             raise LookupError('no such user: {!r}'.format(user))
-        return pwrec[2]
+        uid = pwrec[2]
+    _uid_cache[user] = uid
+    return uid
 
 def getgid(group):
-
-    import grp
-
+    gid = _gid_cache.get(group)
+    if gid is not None:
+        return gid
     if isinstance(group, int):
         try:
             grrec = grp.getgrgid(group)
         except LookupError:
             raise LookupError('gid {!r} not found'.format(group))
-        return group
+        gid = group
     else:
         try:
             grrec = grp.getgrnam(group)
         except LookupError:
             raise LookupError('no such group: {!r}'.format(group))
-        return grrec[2]
+        gid = grrec[2]
+    _gid_cache[group] = gid
+    return gid
 
 def setprocname(procname, key='__PROCNAME__', format='{}'):
     (   "setprocname("
@@ -123,7 +181,23 @@ def find_library(name):
                 return where
 
 def load_library(name, use_errno=True):
-    where = find_library(name)
-    if where is None:
-        raise RuntimeError('needs lib{} installed.'.format(name))
-    return ctypes.CDLL(where, use_errno=use_errno)
+    key = (name, use_errno)
+    lib = _libraries.get(key)
+    if lib is not None:
+        return lib
+
+    # ctypes.util.find_library() runs ldconfig or the compiler in a
+    # subprocess, the usual soname is tried first.
+    if 'c' == name and UNAME_SYSNAME in libc_sonames:
+        try:
+            lib = ctypes.CDLL(libc_sonames[UNAME_SYSNAME],
+                              use_errno=use_errno)
+        except OSError:
+            pass
+    if lib is None:
+        where = find_library(name)
+        if where is None:
+            raise RuntimeError('needs lib{} installed.'.format(name))
+        lib = ctypes.CDLL(where, use_errno=use_errno)
+    _libraries[key] = lib
+    return lib
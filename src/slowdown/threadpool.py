@@ -42,19 +42,14 @@ class DummyThreadPool(object):
         self.hub = hub
         self.size = 0
 
-    def apply(self, func, args=None, kwds=None):
+    def apply(self, func, args=(), kwds=None):
         if args is None:
-            if kwds is None:
-                return func()
-            else:
-                return func(**kwds)
-        else:
-            if kwds is None:
-                return func(*args)
-            else:
-                return func(*args, **kwds)
+            args = ()
+        if kwds is None:
+            return func(*args)
+        return func(*args, **kwds)
 
-    def apply_async(self, func, args=None, kwds=None, callback=None):
+    def apply_async(self, func, args=(), kwds=None, callback=None):
         return \
             gevent.greenlet.Greenlet.spawn(
                 self.apply_cb,
@@ -64,7 +59,7 @@ class DummyThreadPool(object):
                 callback
             )
 
-    def apply_cb(self, func, args=None, kwds=None, callback=None):
+    def apply_cb(self, func, args=(), kwds=None, callback=None):
         result = self.apply(func, args, kwds)
         if callback is not None:
             callback(result)
@@ -84,7 +79,7 @@ class DummyThreadPool(object):
         pass
 
     def map(self, func, iterable):
-        return [func(*i) for i in iterable]
+        return list(map(func, iterable))
 
     def map_async(self, func, iterable, callback=None):
         return \
@@ -101,13 +96,13 @@ class DummyThreadPool(object):
             callback(result)
         return result
 
-    def spawn(func, *args, **kwargs):
+    def spawn(self, func, *args, **kwargs):
         result = gevent.event.AsyncResult()
         try:
             thread_result = \
                 self.apply(
                     func,
-                    args   if   args else None,
+                    args,
                     kwargs if kwargs else None
                 )
         except Exception as err:
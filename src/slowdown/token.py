@@ -40,6 +40,7 @@ import Crypto.Random
 import Crypto.Util.Padding
 import hashlib
 import marshal
+import os
 import xxhash
 
 from . import lrucache
@@ -49,6 +50,12 @@ default_hash_salt_size = 32
 default_hash_func = lambda s: hashlib.sha256(s).digest()
 default_max_token = 1048
 default_magic_bytes = xxhash.xxh32_digest(b'slowdown.token')
+default_random_pool_size = 4096
+
+# Every token has its own salt-derived AES key, so cipher objects
+# cannot be reused across tokens, only the constants are kept.
+aes_block_size = Crypto.Cipher.AES.block_size
+min_token = (16 + aes_block_size * 2 + 2) // 3 * 4
 
 __all__ = ['AES_RC4', 'Hash']
 
@@ -66,7 +73,8 @@ class Hash(object):
     __slots__ = ['data_idx',
                  'hash_func',
                  'max_token',
-                 'salt']
+                 'salt',
+                 'salted']
 
     def __init__(self, salt=None, max_token=-1, hash_func=None):
         if -1 == max_token:
@@ -89,6 +97,27 @@ class Hash(object):
         else:
             raise TypeError('invalid salt type')
 
+        # With the default hash function, the salt is fed once and the
+        # hasher copied per token, so that it is not concatenated with
+        # every payload.
+        if hash_func is None:
+            self.salted = hashlib.sha256(self.salt)
+        else:
+            self.salted = None
+
+    def digest(self, serialized):
+        (   "digest("
+                "serialized:bytes"
+            ") -> bytes" """
+
+        The salted hash of the serialized data.
+        """)
+        if self.salted is None:
+            return self.hash_func(self.salt+serialized)
+        hasher = self.salted.copy()
+        hasher.update(serialized)
+        return hasher.digest()
+
     def pack(self, data):
         (   "pack("
                 "data:object"
@@ -97,7 +126,7 @@ class Hash(object):
         Generate a token from the marshalable data.
         """)
         serialized = marshal.dumps(data)
-        digest     = self.hash_func(self.salt+serialized)
+        digest     = self.digest(serialized)
         b          = digest + serialized
         token      = base64.b64encode(b).decode('utf-8')
         if len(token) > self.max_token:
@@ -117,7 +146,7 @@ class Hash(object):
         b          = base64.b64decode(token)
         digest     = b[0            :self.data_idx]
         serialized = b[self.data_idx:             ]
-        if self.hash_func(self.salt+serialized) != digest:
+        if self.digest(serialized) != digest:
             raise VerificationError('Invalid token')
         return marshal.loads(serialized)
 
@@ -128,21 +157,29 @@ class AES_RC4(object):
             "rc4_key:bytes=None, "
             "cache_size:int=-1, "
             "max_token:int=-1, "
-            "magic_bytes:str=None"
+            "magic_bytes:str=None, "
+            "legacy_keys:bool=True"
         ")" """
 
     The token encrypted by both AES and ARC4 algorithms.
+
+    Tokens issued by earlier versions derived the AES key with MD5. If
+    `legacy_keys` is True, :meth:`unpack` still accepts them when the
+    current key does not fit, so that they survive an upgrade and a
+    rolling deploy.
     """)
 
-    __slots__ = ['aes_key',
+    __slots__ = ['aes_hasher',
+                 'aes_key',
                  'cache',
+                 'legacy_keys',
                  'magic_bytes',
                  'magic_bytes_len',
                  'max_token',
                  'rc4_key']
 
     def __init__(self, aes_key=None, rc4_key=None, cache_size=-1,
-                 max_token=-1, magic_bytes=None):
+                 max_token=-1, magic_bytes=None, legacy_keys=True):
         if aes_key is None:
             self.aes_key = Crypto.Random.get_random_bytes(16)
         else:
@@ -153,6 +190,14 @@ class AES_RC4(object):
             self.rc4_key = Crypto.Random.get_random_bytes(8)
         else:
             self.rc4_key = rc4_key
+
+        # The AES key of each token is the keyed BLAKE2s digest of its
+        # salt. The hasher is keyed once here and copied per token.
+        if len(self.aes_key) > 32:
+            hash_key = hashlib.blake2s(self.aes_key).digest()
+        else:
+            hash_key = self.aes_key
+        self.aes_hasher = hashlib.blake2s(key=hash_key, digest_size=16)
         if -1 == cache_size:
             cache_size = default_aes_cache_size
         self.cache = lrucache.LRUCache(size=cache_size)
@@ -167,6 +212,7 @@ class AES_RC4(object):
         if not isinstance(self.magic_bytes, bytes):
             raise TypeError('magic_bytes must be a bytes object')
         self.magic_bytes_len = len(self.magic_bytes)
+        self.legacy_keys = legacy_keys
 
     def pack(self, data):
         (   "pack("
@@ -176,19 +222,24 @@ class AES_RC4(object):
         Generate a encrypted token from the marshalable data.
         """)
         serialized = self.magic_bytes + marshal.dumps(data)
-        salt = Crypto.Random.get_random_bytes(8)
+        salt = random_bytes(8)
+
+        # xxh64 is not a cryptographic hash, it only makes the RC4 key
+        # differ from token to token, the secrecy comes from AES.
         key  = xxhash.xxh64_digest(salt + self.rc4_key)
         cipher = Crypto.Cipher.ARC4.new(key)
         ct     = cipher.encrypt(serialized)
         serialized = salt + ct
-        salt = Crypto.Random.get_random_bytes(16)
-        key  = hashlib.md5(salt + self.aes_key).digest()
+        salt = random_bytes(16)
+        hasher = self.aes_hasher.copy()
+        hasher.update(salt)
+        key  = hasher.digest()
         cipher = Crypto.Cipher.AES.new(key, Crypto.Cipher.AES.MODE_CBC)
         ct     = \
             cipher.encrypt(
                 Crypto.Util.Padding.pad(
                     serialized,
-                    Crypto.Cipher.AES.block_size
+                    aes_block_size
                 )
             )
         serialized = salt + cipher.iv + ct
@@ -210,7 +261,12 @@ class AES_RC4(object):
             raise ValueError('token too large')
         holder = self.cache.get(token)
         if holder is None:
-            block_size = Crypto.Cipher.AES.block_size
+            block_size = aes_block_size
+
+            # Tokens are padded base64 of at least the salt, the IV and
+            # one block, anything else is refused before decoding.
+            if len(token) < min_token or len(token) % 4 != 0:
+                raise VerificationError('Invalid token')
             serialized = base64.b64decode(token)
             p      = 16 + block_size
             salt   = serialized[ 0:16]
@@ -220,31 +276,91 @@ class AES_RC4(object):
                len( iv ) != block_size or \
                len( ct )  % block_size != 0:
                 raise VerificationError('Invalid token')
-            key    = hashlib.md5(salt + self.aes_key).digest()
-            cipher = \
-                Crypto.Cipher.AES.new(
-                    key,
-                    Crypto.Cipher.AES.MODE_CBC,
-                    iv
-                )
-            serialized = \
-                Crypto.Util.Padding.unpad(
-                    cipher.decrypt(ct),
-                    Crypto.Cipher.AES.block_size
-                )
-            salt   = serialized[0:8]
-            ct     = serialized[8: ]
-            key    = xxhash.xxh64_digest(salt + self.rc4_key)
-            cipher = Crypto.Cipher.ARC4.new(key)
-            serialized = cipher.encrypt(ct)
-            if serialized[0:self.magic_bytes_len] != self.magic_bytes:
+            hasher = self.aes_hasher.copy()
+            hasher.update(salt)
+            serialized = self._decrypt(hasher.digest(), iv, ct)
+            if serialized is None and self.legacy_keys:
+                serialized = \
+                    self._decrypt(
+                        hashlib.md5(salt + self.aes_key).digest(),
+                        iv,
+                        ct
+                    )
+            if serialized is None:
                 raise VerificationError('Invalid token')
-            data = marshal.loads(serialized[self.magic_bytes_len:])
+            data = marshal.loads(serialized)
             self.cache[token] = Holder(data)
             return data
         else:
             return holder.data
 
+    def _decrypt(self, key, iv, ct):
+        cipher = \
+            Crypto.Cipher.AES.new(
+                key,
+                Crypto.Cipher.AES.MODE_CBC,
+                iv
+            )
+        try:
+            serialized = \
+                Crypto.Util.Padding.unpad(
+                    cipher.decrypt(ct),
+                    aes_block_size
+                )
+        except ValueError:
+            return None
+        salt   = serialized[0:8]
+        ct     = serialized[8: ]
+        key    = xxhash.xxh64_digest(salt + self.rc4_key)
+        cipher = Crypto.Cipher.ARC4.new(key)
+        serialized = cipher.encrypt(ct)
+        if serialized[0:self.magic_bytes_len] != self.magic_bytes:
+            return None
+        return serialized[self.magic_bytes_len:]
+
+class RandomPool(object):
+
+    (   "RandomPool("
+            "size:int=-1"
+        ")" """
+
+    Random bytes from the kernel, fetched `size` bytes at a time rather
+    than with a syscall per call.
+    """)
+
+    __slots__ = ['buf', 'pos', 'size']
+
+    def __init__(self, size=-1):
+        if -1 == size:
+            self.size = default_random_pool_size
+        else:
+            self.size = size
+        self.clear()
+
+    def __call__(self, n):
+        pos = self.pos
+        end = pos + n
+        if end > len(self.buf):
+            if n > self.size:
+                return Crypto.Random.get_random_bytes(n)
+            self.buf = Crypto.Random.get_random_bytes(self.size)
+            pos = 0
+            end = n
+        self.pos = end
+        return self.buf[pos:end]
+
+    def clear(self):
+        self.buf = b''
+        self.pos = 0
+
+# A forked child must not hand out the bytes its parent still holds, the
+# pool is only used where it can be emptied after fork().
+if hasattr(os, 'register_at_fork'):
+    random_bytes = RandomPool()
+    os.register_at_fork(after_in_child=random_bytes.clear)
+else:
+    random_bytes = Crypto.Random.get_random_bytes
+
 class Holder(object):
 
     __slots__ = ['data', '__weakref__']
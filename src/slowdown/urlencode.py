@@ -1,5 +1,7 @@
 # Copyright (c) 2020 Wilhelm Shen. See LICENSE for details.
 
+import functools
+import re
 import sys
 import urllib.parse
 
@@ -10,10 +12,14 @@ def quote(string, safe='/', encoding=None, errors=None):
             "string:Union[str,bytes]"
         ") -> bytes"
     )
-    return \
-        as_bytes(
-            urllib.parse.quote(string, safe, encoding, errors)
-        )
+    if type(string) is bytes and encoding is None and errors is None:
+        (b_safe, regx_unsafe) = quoting(safe)
+        if not string.translate(None, b_safe):
+            return string
+        return regx_unsafe.sub(escape_match, string)
+
+    # the percent-encoded result is always ASCII
+    return urllib.parse.quote(string, safe, encoding, errors).encode('ascii')
 
 def quote_plus(string, safe='', encoding=None, errors=None):
     (   "quote_plus("
@@ -21,33 +27,55 @@ def quote_plus(string, safe='', encoding=None, errors=None):
         ") -> bytes"
     )
     return \
-        as_bytes(
-            urllib.parse.quote_plus(string, safe, encoding, errors)
-        )
+        urllib.parse.quote_plus(string, safe, encoding, errors) \
+                    .encode('ascii')
 
 def unquote(string, encoding='utf-8', errors='replace'):
     (   "unquote("
             "string:Union[str,bytes]"
         ") -> bytes"
     )
-    return \
-        as_bytes(
-            urllib.parse.unquote(string.decode(), encoding, errors)
-        )
+    # Percent-decoding the bytes as they are gives the same result for
+    # UTF-8 and skips the str round trip.
+    if 'utf-8' == encoding:
+        return \
+            urllib.parse.unquote_to_bytes(string) \
+                        .decode(encoding, errors) \
+                        .encode()
+    return urllib.parse.unquote(string.decode(), encoding, errors).encode()
 
 def unquote_plus(string, encoding='utf-8', errors='replace'):
     (   "unquote_plus("
             "string:Union[str,bytes]"
         ") -> bytes"
     )
+    if 'utf-8' == encoding:
+        return \
+            urllib.parse.unquote_to_bytes(string.replace(b'+', b' ')) \
+                        .decode(encoding, errors) \
+                        .encode()
     return \
-        as_bytes(
-            urllib.parse.unquote_plus(
-                string.decode(),
-                encoding,
-                errors
-            )
-        )
+        urllib.parse.unquote_plus(
+            string.decode(),
+            encoding,
+            errors
+        ).encode()
+
+@functools.lru_cache(maxsize=64)
+def quoting(safe):
+    (   "quoting("
+            "safe:Union[str,bytes]"
+        ") -> Tuple[bytes, Pattern]" """
+
+    The bytes that `quote()` leaves as they are, and a regex matching
+    any other byte, following the rules of **urllib.parse.quote** .
+    """)
+    if isinstance(safe, str):
+        b_safe = safe.encode('ascii', 'ignore')
+    else:
+        b_safe = bytes(c for c in safe if c < 128)
+    b_safe = always_safe + b_safe
+    return (b_safe, re.compile(b'[^' + re.escape(b_safe) + b']'))
 
 def as_bytes(string, encoding=None):
     (   "as_bytes("
@@ -55,6 +83,8 @@ def as_bytes(string, encoding=None):
             "encoding:str=None"
         ") -> bytes"
     )
+    if type(string) is bytes:
+        return string
     if   isinstance(string, str):
         return \
             string.encode(
@@ -67,3 +97,9 @@ def as_bytes(string, encoding=None):
             TypeError(
                 f'expected binary or unicode string, got {repr(string)}'
             )
+
+always_safe = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ' \
+              b'abcdefghijklmnopqrstuvwxyz' \
+              b'0123456789_.-~'
+escapes = {bytes([c]): b'%%%02X' % c for c in range(256)}
+escape_match = lambda match: escapes[match.group()]
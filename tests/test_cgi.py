@@ -0,0 +1,54 @@
+# Copyright (c) 2020 Wilhelm Shen. See LICENSE for details.
+
+import io
+import unittest
+
+from slowdown import cgi
+from slowdown import http
+
+class Socket(object):
+
+    def sendall(self, data):
+        pass
+
+def new_file(body, boundary):
+    # io.BytesIO has no peek(), so MultipartRawIO takes every line
+    # through its line-based parser.
+    environ = \
+        {
+            'locals.content_length': len(body),
+            'CONTENT_TYPE': f'multipart/form-data; boundary={boundary}',
+            'QUERY_STRING': ''
+        }
+    return http.File(Socket(), io.BytesIO(body), environ)
+
+def build_body(parts, boundary):
+    body = b''
+    for name, content in parts:
+        body += (b'--%s\r\n'
+                 b'Content-Disposition: form-data; name="%s"\r\n'
+                 b'\r\n'
+                 b'%s\r\n') % (boundary, name, content)
+    return body + b'--%s--\r\n' % boundary
+
+class MultipartTest(unittest.TestCase):
+
+    def parse(self, parts):
+        body = build_body(parts, b'BOUNDARY')
+        rw = new_file(body, 'BOUNDARY')
+        return [(part.name.encode(), part.read())
+                for part in cgi.multipart(rw)]
+
+    def test_cr_at_line_boundary(self):
+        # The 2047-byte line and its CR fill a whole readline(2048)
+        # while the CRLF of the previous line is still held back.
+        parts = [(b'file', b'x\r\n' + b'a' * 2047 + b'\r' + b'tail'),
+                 (b'name', b'value')]
+        self.assertEqual(self.parse(parts), parts)
+
+    def test_cr_at_consecutive_line_boundaries(self):
+        parts = [(b'file', (b'a' * 2047 + b'\r') * 3 + b'\n')]
+        self.assertEqual(self.parse(parts), parts)
+
+if '__main__' == __name__:
+    unittest.main()